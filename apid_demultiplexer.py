@@ -0,0 +1,34 @@
+"""Route each framed packet to the decoder registered for its APID"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+from collections import Counter
+import ccsds
+
+
+class ApidDemultiplexer:
+    """
+    One dict lookup per packet picks the handler. Packets with an APID nobody registered are counted and dropped.
+    Every packet is counted by APID so it's easy to see what is actually on the link.
+    """
+    def __init__(self):
+        self.handlers = {}
+        self.packet_counts = Counter()  # Keyed by APID
+        self.packets_dropped = 0
+
+    def register(self, apid, handler):
+        # handler(packet) is called with the whole packet, primary header included, and its result is passed back
+        self.handlers[apid] = handler
+
+    def dispatch(self, packet):
+        apid = ccsds.get_apid(packet)
+        self.packet_counts[apid] += 1
+
+        handler = self.handlers.get(apid)
+        if handler is None:
+            self.packets_dropped += 1
+            return None
+        return handler(packet)
+
+    def get_statistics(self):
+        return {'packet_counts': dict(self.packet_counts), 'packets_dropped': self.packets_dropped}
@@ -0,0 +1,92 @@
+"""Decode AX.25 UI frame headers so beacons can be picked out by callsign"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+from collections import namedtuple
+
+ADDRESS_LENGTH = 7  # 6 callsign characters shifted left one bit, then the SSID byte
+MAX_REPEATERS = 8
+UI_CONTROL = 0x03  # Unnumbered information; 0x10 is the poll/final bit
+NO_LAYER_3_PID = 0xF0
+
+UNSHIFT_TABLE = bytes(byte >> 1 for byte in range(256))  # Undo the one bit shift on every callsign character
+
+# info is a memoryview into the frame that was parsed, so it costs nothing to hand on to the telemetry parser
+Ax25Frame = namedtuple('Ax25Frame', ['destination', 'destination_ssid', 'source', 'source_ssid', 'repeaters',
+                                     'control', 'pid', 'info'])
+
+
+class Ax25Error(ValueError):
+    pass
+
+
+def decode_address(frame_view, index):
+    callsign = bytes(frame_view[index:index + 6]).translate(UNSHIFT_TABLE).decode('ascii', 'replace').rstrip()
+    ssid = (frame_view[index + 6] >> 1) & 0x0F
+    is_last_address = bool(frame_view[index + 6] & 0x01)
+    return callsign, ssid, is_last_address
+
+
+def parse_ax25_frame(frame):
+    """
+    Parse the header of an AX.25 UI frame (as delivered by a KISS TNC, i.e., without flags or FCS)
+    Input:
+        frame [bytes-like]: One AX.25 frame
+    Returns:
+        Ax25Frame; raises Ax25Error if the frame is too short or not a UI frame
+    """
+    frame_view = memoryview(frame)
+    if len(frame_view) < 2 * ADDRESS_LENGTH + 2:
+        raise Ax25Error('Frame too short for an AX.25 header: {} bytes.'.format(len(frame_view)))
+
+    destination, destination_ssid, _ = decode_address(frame_view, 0)
+    source, source_ssid, is_last_address = decode_address(frame_view, ADDRESS_LENGTH)
+
+    repeaters = []
+    index = 2 * ADDRESS_LENGTH
+    while not is_last_address:
+        if len(repeaters) == MAX_REPEATERS or len(frame_view) < index + ADDRESS_LENGTH + 2:
+            raise Ax25Error('AX.25 address field never ends.')
+        callsign, ssid, is_last_address = decode_address(frame_view, index)
+        repeaters.append((callsign, ssid))
+        index += ADDRESS_LENGTH
+
+    control = frame_view[index]
+    if control & ~0x10 != UI_CONTROL:
+        raise Ax25Error('Not an AX.25 UI frame: control byte 0x{:02x}.'.format(control))
+    pid = frame_view[index + 1]
+
+    return Ax25Frame(destination, destination_ssid, source, source_ssid, tuple(repeaters), control, pid,
+                     frame_view[index + 2:])
+
+
+class Ax25StationFilter:
+    """
+    Only lets through frames sent by the given stations so other traffic on the channel never reaches the parser.
+    Stations are callsign strings (any SSID) or (callsign, ssid) tuples.
+    """
+    def __init__(self, source_stations):
+        self.source_callsigns = set()
+        self.source_callsigns_with_ssid = set()
+        for station in source_stations:
+            if isinstance(station, tuple):
+                self.source_callsigns_with_ssid.add((station[0].upper(), station[1]))
+            else:
+                self.source_callsigns.add(station.upper())
+
+        self.frames_accepted = 0
+        self.frames_rejected = 0
+
+    def accepts(self, frame):
+        # Only the two address fields are decoded here; that's all it takes to reject a frame
+        frame_view = memoryview(frame)
+        accepted = False
+        if len(frame_view) >= 2 * ADDRESS_LENGTH:
+            source, source_ssid, _ = decode_address(frame_view, ADDRESS_LENGTH)
+            accepted = source in self.source_callsigns or (source, source_ssid) in self.source_callsigns_with_ssid
+
+        if accepted:
+            self.frames_accepted += 1
+        else:
+            self.frames_rejected += 1
+        return accepted
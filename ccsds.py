@@ -0,0 +1,37 @@
+"""CCSDS space packet primary header"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import struct
+from collections import namedtuple
+
+PRIMARY_HEADER_LENGTH = 6  # [bytes]
+PRIMARY_HEADER = struct.Struct('>HHH')
+
+# Sequence flags say where a packet sits in a segmented group
+CONTINUATION_SEGMENT = 0
+FIRST_SEGMENT = 1
+LAST_SEGMENT = 2
+UNSEGMENTED = 3
+
+SECONDARY_HEADER_FLAG = 0x0800  # In the first header word
+APID_MASK = 0x07FF
+SEQUENCE_COUNT_MASK = 0x3FFF
+
+CcsdsPrimaryHeader = namedtuple('CcsdsPrimaryHeader', ['version', 'packet_type', 'secondary_header_flag', 'apid',
+                                                       'sequence_flags', 'sequence_count', 'packet_data_length'])
+
+
+def parse_primary_header(buffer, offset=0):
+    packet_id, sequence_control, packet_data_length = PRIMARY_HEADER.unpack_from(buffer, offset)
+    return CcsdsPrimaryHeader(packet_id >> 13, (packet_id >> 12) & 0x1, (packet_id >> 11) & 0x1, packet_id & APID_MASK,
+                              sequence_control >> 14, sequence_control & SEQUENCE_COUNT_MASK, packet_data_length)
+
+
+def get_packet_length(header):
+    # The length field counts the bytes after the primary header, minus one
+    return PRIMARY_HEADER_LENGTH + header.packet_data_length + 1
+
+
+def get_apid(buffer, offset=0):
+    return ((buffer[offset] << 8) | buffer[offset + 1]) & APID_MASK
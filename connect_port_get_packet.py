@@ -2,46 +2,113 @@
 __authors__ = "James Paul Mason"
 __contact__ = "jmason86@gmail.com"
 
+import asyncio
+import kiss
 import serial
 import socket
-from find_sync_bytes import FindSyncBytes
+from collections import Counter, deque
+from sync_framer import SyncFramer
 from logger import Logger
 
 
 class PacketReader:
+    def __init__(self):
+        self.framer = SyncFramer()  # Holds bytes read from the port that haven't been returned in a packet yet
+        self.kiss_deframer = None  # Only set when the port delivers KISS frames rather than the raw packet stream
+        self.ax25_filter = None  # Drops KISS frames from stations we aren't listening for
+        self.frame_checker = None  # Drops KISS frames that fail their frame check
+        self.end_of_stream = False  # Set once the other end has closed the connection
+        self.connectionless = False  # True for datagram ports, where an empty read is an empty datagram, not a close
+        self.raw_capture = None  # Records every read before framing
+        self.raw_capture_source_id = None
+
     def read_packet(self):
-        #  From all of the binary coming in, grab and return a single packet including all headers/footers
-        packet = bytearray()
+        #  From all of the binary coming in, grab and return a single packet including all headers/footers.
+        #  Returns empty bytes if the port had nothing to give (timeout or closed connection).
+        packet = self.framer.next_packet()
+        while packet is None:
+            buffered_data = self.read_data()
+            if len(buffered_data) == 0:
+                return bytes()
+            packet = next(self.frame_data(buffered_data), None)
+        return packet
 
-        found_sync_start_index = 0
+    def read_data(self):
+        # get_data_from_buffer plus the raw capture tap. Everything that reads a port should come through here.
+        buffered_data = self.get_data_from_buffer()
+        if self.raw_capture is not None and len(buffered_data) > 0:
+            self.raw_capture.write(self.raw_capture_source_id, buffered_data)
+        return buffered_data
 
-        while found_sync_start_index == 0 or len(packet) < 400:
-            buffered_data = self.get_data_from_buffer()
-            for byte in buffered_data:
-                packet.append(byte)
-            fsb = FindSyncBytes()
-            if fsb.find_sync_start_index(packet) != -1:
-                found_sync_start_index+=1
+    def frame_data(self, buffered_data):
+        # Hand newly read bytes to the framer (through the KISS deframer if on) and iterate the packets they complete
+        if self.kiss_deframer is None:
+            return self.framer.feed(buffered_data)
 
-            if found_sync_start_index:
-                start_ind = fsb.find_sync_start_index(packet)
-                packet = packet[start_ind:]
+        for kiss_frame in self.kiss_deframer.feed(buffered_data):
+            ax25_frame = self.check_kiss_frame(kiss_frame)
+            if ax25_frame is not None:
+                # The whole AX.25 frame goes on to the framer: a beacon is split across frames and its documented
+                # layout (raw_data.txt) includes the AX.25 header that sits between the two halves
+                self.framer.feed(ax25_frame)
+        return iter(self.framer.next_packet, None)
 
-        return packet
+    def check_kiss_frame(self, kiss_frame):
+        # Returns the AX.25 frame inside if it's data that passes the frame check and station filter, otherwise None
+        if kiss_frame.command != kiss.DATA_FRAME:
+            return None
+        ax25_frame = kiss_frame.payload
+        if self.frame_checker is not None:
+            ax25_frame = self.frame_checker.check_ax25_frame(ax25_frame)
+            if ax25_frame is None:
+                return None
+        if self.ax25_filter is not None and not self.ax25_filter.accepts(ax25_frame):
+            return None
+        return ax25_frame
+
+    def reset_framing(self):
+        # Throw away any partly framed packet, e.g., after a reconnect
+        self.framer.reset()
+        if self.kiss_deframer is not None:
+            self.kiss_deframer.reset()
+
+    def get_framer_statistics(self):
+        return self.framer.get_statistics()
+
+    def set_raw_capture(self, raw_capture, source_id):
+        # Takes a raw_capture.RawCaptureWriter, or None to stop capturing
+        self.raw_capture = raw_capture
+        self.raw_capture_source_id = source_id
+
+    def set_decode_kiss(self, decode_kiss):
+        if decode_kiss and self.kiss_deframer is None:
+            self.kiss_deframer = kiss.KissDeframer()
+        elif not decode_kiss:
+            self.kiss_deframer = None
+
+    def set_ax25_filter(self, ax25_filter):
+        # Takes an ax25.Ax25StationFilter, or None to let everything through. Needs KISS decoding to see frame edges.
+        self.ax25_filter = ax25_filter
+
+    def set_frame_checker(self, frame_checker):
+        # Takes a frame_check.FrameChecker, or None to skip checking. Needs KISS decoding to see frame edges.
+        self.frame_checker = frame_checker
 
     @staticmethod
     def get_data_from_buffer():
         # Placeholder method to be overridden by subclasses for serial and sockets
         # because they have different objects to read from and syntax to read with.
+        # May return any number of bytes; an empty result means nothing arrived.
         return bytearray()
 
 
 class ConnectSerial(PacketReader):
-    def __init__(self, port, baud_rate, log):
+    def __init__(self, port, baud_rate, log, read_timeout=0.1):
         super(ConnectSerial, self).__init__()
 
         self.port = port
         self.baud_rate = baud_rate
+        self.read_timeout = read_timeout  # [s]: How long a read waits for the first byte to show up
         self.log = Logger().create_log()
 
         self.ser = None
@@ -52,7 +119,8 @@ class ConnectSerial(PacketReader):
     def connect_to_port(self):
         self.log.info("Opening serial port {0} at baud rate {1}".format(self.port, self.baud_rate))
 
-        self.ser = serial.Serial(self.port, self.baud_rate)
+        self.ser = None
+        self.ser = serial.Serial(self.port, self.baud_rate, timeout=self.read_timeout)
         if not self.ser.readable():
             self.log.error('Serial port not readable.')
             self.port_readable = False
@@ -62,21 +130,29 @@ class ConnectSerial(PacketReader):
             return self
 
     def get_data_from_buffer(self):
-        return bytearray(self.ser.read())
+        # Grab everything the driver has buffered in one call, or wait up to read_timeout for at least one byte
+        return self.ser.read(max(self.ser.in_waiting, 1))
+
+    def fileno(self):
+        return self.ser.fileno()
 
     def close(self):
         self.log.info("Closing serial port.")
-        self.ser.close()
+        if self.ser is not None:
+            self.ser.close()
 
 
 class ConnectSocket(PacketReader):
-    def __init__(self, ip_address, port):
+    def __init__(self, ip_address, port, chunk_size=4096):
         super(ConnectSocket, self).__init__()
 
         self.ip_address = ip_address
         self.port = port
         self.log = Logger().create_log()
 
+        self.chunk_size = chunk_size  # [bytes]: Most that a single recv will hand back
+        self.receive_buffer = memoryview(bytearray(chunk_size))
+
         self.client_socket = None
         self.port_readable = None
 
@@ -84,6 +160,7 @@ class ConnectSocket(PacketReader):
         self.log.info("Opening IP address: {0} on port: {1}".format(self.ip_address, self.port))
 
         self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.end_of_stream = False
 
         try:
             self.client_socket.connect((self.ip_address, int(self.port)))
@@ -92,13 +169,252 @@ class ConnectSocket(PacketReader):
         except socket.error as error:
             self.log.warning("Failed connecting to {0} on port {1}".format(self.ip_address, self.port))
             self.log.warning(''.format(error))
+            self.client_socket.close()
             self.port_readable = False
         finally:
             return self
 
     def get_data_from_buffer(self):
-        return bytearray(self.client_socket.recv(1))
-    
+        # The returned view points into receive_buffer, so it is only valid until the next call
+        number_of_bytes = self.client_socket.recv_into(self.receive_buffer)
+        if number_of_bytes == 0:
+            self.end_of_stream = True
+        return self.receive_buffer[:number_of_bytes]
+
+    def fileno(self):
+        return self.client_socket.fileno()
+
     def close(self):
         self.log.info("Closing TCP/IP port.")
+        try:
+            self.client_socket.shutdown(socket.SHUT_RDWR)  # Wakes up a read blocked on another thread
+        except OSError:
+            pass  # Never connected, or the peer already hung up
         self.client_socket.close()
+
+
+class ConnectKissSocket(ConnectSocket):
+    """
+    Client for software TNCs (e.g., Dire Wolf, soundmodem) that serve KISS over TCP. Always decodes KISS, keeps a
+    separate framer per KISS port so segments from different radios never get mixed. read_frame() gives one KISS
+    frame at a time for anything that wants the AX.25 frames themselves; read_packet() works like every other port.
+    Wrap it in a port_supervisor.PortSupervisor to have it reconnect when the TNC restarts.
+    Input:
+        kiss_ports [list]: KISS ports (0-15) to take frames from; None for all of them
+    """
+    def __init__(self, ip_address, port=8001, kiss_ports=None, chunk_size=4096):
+        super(ConnectKissSocket, self).__init__(ip_address, port, chunk_size=chunk_size)
+
+        self.kiss_deframer = kiss.KissDeframer()
+        self.kiss_ports = None if kiss_ports is None else set(kiss_ports)
+
+        self.framers = {0: self.framer}  # Keyed by KISS port
+        self.pending_frames = deque()
+        self.pending_packets = deque()
+
+        self.frames_received = Counter()  # Keyed by KISS port
+
+    def set_decode_kiss(self, decode_kiss):
+        if not decode_kiss:
+            self.log.warning("KISS TCP/IP ports always decode KISS; ignoring request to turn it off.")
+
+    def deframe(self, buffered_data):
+        # KISS frames in the newly read bytes that came in on a port we're listening to
+        kiss_frames = []
+        for kiss_frame in self.kiss_deframer.feed(buffered_data):
+            if self.kiss_ports is not None and kiss_frame.port not in self.kiss_ports:
+                continue
+            self.frames_received[kiss_frame.port] += 1
+            kiss_frames.append(kiss_frame)
+        return kiss_frames
+
+    def read_frame(self):
+        """
+        Returns the next KISS frame, or None if the TNC closed the connection
+        """
+        while not self.pending_frames:
+            buffered_data = self.read_data()
+            if len(buffered_data) == 0:
+                return None
+            self.pending_frames.extend(self.deframe(buffered_data))
+        return self.pending_frames.popleft()
+
+    def read_packet(self):
+        while not self.pending_packets:
+            kiss_frame = self.read_frame()
+            if kiss_frame is None:
+                return bytes()
+            self.pending_packets.extend(self.frame_kiss_frame(kiss_frame))
+        return self.pending_packets.popleft()
+
+    def frame_data(self, buffered_data):
+        packets = []
+        for kiss_frame in self.deframe(buffered_data):
+            packets += self.frame_kiss_frame(kiss_frame)
+        return iter(packets)
+
+    def frame_kiss_frame(self, kiss_frame):
+        # Packets completed by this frame, from the framer for the port it came in on
+        ax25_frame = self.check_kiss_frame(kiss_frame)
+        if ax25_frame is None:
+            return []
+        if kiss_frame.port not in self.framers:
+            self.framers[kiss_frame.port] = SyncFramer()
+        return list(self.framers[kiss_frame.port].feed(ax25_frame))
+
+    def reset_framing(self):
+        # Frames already pulled out whole are kept; only the half sent ones go
+        self.kiss_deframer.reset()
+        for framer in self.framers.values():
+            framer.reset()
+
+    def get_framer_statistics(self):
+        # Added up over the framers for every KISS port
+        statistics = Counter()
+        for framer in self.framers.values():
+            statistics.update(framer.get_statistics())
+        return dict(statistics)
+
+
+class ConnectUdp(PacketReader):
+    """
+    Listens for networked receivers and SDR decoders that send one whole packet per UDP datagram. Each datagram is
+    taken as it is, so the sync search framer is skipped entirely. Datagrams land in one preallocated buffer and only
+    the bytes received are copied out. Counts are kept per sender address.
+    Input:
+        ip_address [str]: Local address to listen on, e.g., '0.0.0.0' for every interface
+        port [int]: Local port to listen on
+        read_timeout [float]: [s] How long a read waits for a datagram before returning empty bytes
+        socket_buffer_size [int]: [bytes] Kernel receive buffer to ask for so bursts queue up instead of being
+                                  dropped while the reader is busy. The OS may cap it (net.core.rmem_max on Linux).
+    """
+    max_datagram_size = 65536  # [bytes]: Bigger than any UDP payload, so nothing gets truncated
+
+    def __init__(self, ip_address, port, read_timeout=0.1, socket_buffer_size=4194304):
+        super(ConnectUdp, self).__init__()
+
+        self.ip_address = ip_address
+        self.port = port
+        self.read_timeout = read_timeout
+        self.socket_buffer_size = socket_buffer_size
+        self.log = Logger().create_log()
+
+        self.receive_buffer = memoryview(bytearray(self.max_datagram_size))
+        self.udp_socket = None
+        self.port_readable = None
+        self.connectionless = True
+
+        self.datagrams_received = Counter()  # Keyed by sender address
+        self.bytes_received = Counter()  # Keyed by sender address
+
+    def connect_to_port(self):
+        self.log.info("Listening for UDP on IP address: {0} port: {1}".format(self.ip_address, self.port))
+
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.settimeout(self.read_timeout)
+        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socket_buffer_size)
+        try:
+            self.udp_socket.bind((self.ip_address, int(self.port)))
+            self.log.info('Successful UDP port open.')
+            self.port_readable = True
+        except socket.error as error:
+            self.log.warning("Failed binding to {0} on port {1}: {2}".format(self.ip_address, self.port, error))
+            self.udp_socket.close()
+            self.port_readable = False
+        return self
+
+    def get_data_from_buffer(self):
+        # One datagram per call, copied out of receive_buffer so it can be queued. Empty on timeout or for a zero
+        # length datagram.
+        try:
+            number_of_bytes, sender_address = self.udp_socket.recvfrom_into(self.receive_buffer)
+        except socket.timeout:
+            return bytes()
+        self.datagrams_received[sender_address] += 1
+        self.bytes_received[sender_address] += number_of_bytes
+        return bytes(self.receive_buffer[:number_of_bytes])
+
+    def read_packet(self):
+        return self.read_data()
+
+    def frame_data(self, buffered_data):
+        return iter([buffered_data])
+
+    def get_statistics(self):
+        return {'{0}:{1}'.format(*sender_address): {'datagrams_received': self.datagrams_received[sender_address],
+                                                    'bytes_received': self.bytes_received[sender_address]}
+                for sender_address in self.datagrams_received}
+
+    def fileno(self):
+        return self.udp_socket.fileno()
+
+    def close(self):
+        self.log.info("Closing UDP port.")
+        self.udp_socket.close()
+
+
+class AsyncConnectSocket:
+    """
+    asyncio version of ConnectSocket so many TCP/IP feeds can share one event loop instead of a thread each.
+    read_packet() is a coroutine with the same contract as PacketReader.read_packet, and the object is an async
+    iterator over packets that ends when the peer closes the connection.
+    """
+    def __init__(self, ip_address, port, chunk_size=4096):
+        self.ip_address = ip_address
+        self.port = port
+        self.chunk_size = chunk_size  # [bytes]: Most that a single read will hand back
+        self.log = Logger().create_log()
+
+        self.framer = SyncFramer()
+        self.reader = None
+        self.writer = None
+        self.port_readable = None
+
+    async def connect_to_port(self):
+        self.log.info("Opening IP address: {0} on port: {1}".format(self.ip_address, self.port))
+
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.ip_address, int(self.port))
+            self.log.info('Successful TCP/IP port open.')
+            self.port_readable = True
+        except OSError as error:
+            self.log.warning("Failed connecting to {0} on port {1}".format(self.ip_address, self.port))
+            self.log.warning('{}'.format(error))
+            self.port_readable = False
+        return self
+
+    async def read_packet(self):
+        # Cancelling a pending read closes the connection so nothing is left half open
+        try:
+            packet = self.framer.next_packet()
+            while packet is None:
+                buffered_data = await self.reader.read(self.chunk_size)
+                if len(buffered_data) == 0:
+                    return bytes()
+                packet = next(self.framer.feed(buffered_data), None)
+            return packet
+        except asyncio.CancelledError:
+            await self.close()
+            raise
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        packet = await self.read_packet()
+        if len(packet) == 0:
+            raise StopAsyncIteration
+        return packet
+
+    async def close(self):
+        if self.writer is None:
+            return
+        self.log.info("Closing TCP/IP port.")
+        writer, self.writer = self.writer, None
+        writer.close()
+        if not hasattr(writer, 'wait_closed'):
+            return  # Python < 3.7: close() is all there is
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass  # Peer already dropped the connection; it's closed either way
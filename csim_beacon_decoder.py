@@ -1,6 +1,8 @@
 import sys
 import os
 import configparser
+import queue
+from collections import namedtuple
 from PySide2 import QtGui, QtCore
 from PySide2.QtWidgets import QMainWindow, QApplication
 from PySide2.QtGui import QColor
@@ -11,14 +13,29 @@ import connect_port_get_packet
 import file_upload
 import datetime
 from serial.tools import list_ports  # This is pyserial, not plain serial
-from csim_parser import CsimParser
+from csim_parser import CsimDecoder
+from log_message_parser import LogMessageParser
+from ax25 import Ax25StationFilter
+from apid_demultiplexer import ApidDemultiplexer
+from frame_check import FrameChecker
+from port_supervisor import PortSupervisor
+from raw_capture import RawCaptureWriter
+import port_supervisor
+from find_sync_bytes import FindSyncBytes
+import ccsds
+import pipeline
 
 """Call the GUI and attach it to functions."""
 __author__ = "James Paul Mason"
 __contact__ = "jmason86@gmail.com"
 
+# What the decode stage hands on to the persistence and display stages
+DecodedPacket = namedtuple('DecodedPacket', ['packet', 'hex_string', 'telemetry'])
+
 
 class MainWindow(QMainWindow, Ui_MainWindow):
+    port_state_changed = QtCore.Signal(str)  # Emitted from the port read thread; Qt queues it over to the GUI's
+
     def __init__(self):
         super(MainWindow, self).__init__()
 
@@ -30,6 +47,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.base_output_filename = None
         self.output_hex_filename = None
         self.output_binary_filename = None
+        self.frame_checker = FrameChecker()  # Turn on check_fcs for TNCs that pass the AX.25 FCS through
+        self.apid_demultiplexer = None
+        self.csim_decoder = CsimDecoder()  # Shared by every packet
+        self.pipeline = None
+        self.display_timer = None
+        self.port_supervisor = None
+        self.raw_capture = None
 
         self.log = Logger().create_log()
         self.log.info("Launched CSIM Beacon Decoder.")
@@ -40,7 +64,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.connect_ui_to_functions()
         self.setup_last_used_settings()
         self.setup_output_files()
+        self.setup_apid_demultiplexer()
+        self.setup_pipeline()
         self.port_read_thread = PortReadThread(self.read_port, self.stop_read)
+        self.port_state_changed.connect(self.display_gui_port_state)
         QApplication.instance().aboutToQuit.connect(self.prepare_to_exit)
         self.show()
 
@@ -90,6 +117,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.set_base_output_filename()
         self.setup_output_file_decoded_data_as_hex()
         self.setup_output_file_decoded_data_as_binary()
+        self.set_output_failed_frame_filename()
 
     def set_base_output_filename(self):
         callsign = self.lineEdit_callsign.text()
@@ -131,6 +159,35 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def set_output_binary_filename(self):
         self.output_binary_filename = self.base_output_filename + ".dat"
 
+    def set_output_failed_frame_filename(self):
+        # Kept apart from the .dat so failed frames never get decoded or forwarded as good data
+        self.frame_checker.failed_frame_filename = self.base_output_filename + "_failed_frames.dat"
+
+    def setup_apid_demultiplexer(self):
+        fsb = FindSyncBytes()
+        self.apid_demultiplexer = ApidDemultiplexer()
+        self.apid_demultiplexer.register(ccsds.get_apid(fsb.start_sync_bytes), self.decode_beacon)
+        self.apid_demultiplexer.register(ccsds.get_apid(fsb.log_sync_bytes), self.decode_log_message)
+
+    def setup_pipeline(self):
+        """
+        The port read thread only reads; decoding, saving to disk and updating the GUI each happen in their own stage
+        so a slow disk or a busy GUI can't hold up the serial port. Saving blocks rather than lose data, while the
+        freshest packets win everywhere else.
+        """
+        self.pipeline = pipeline.Pipeline()
+        self.pipeline.add_queue('packets', 1000, pipeline.DROP_OLDEST)
+        self.pipeline.add_queue('persistence', 1000, pipeline.BLOCK)
+        self.pipeline.add_queue('display', 100, pipeline.DROP_OLDEST)
+        self.pipeline.add_stage('decode', self.decode_packet, 'packets', ['persistence', 'display'])
+        self.pipeline.add_stage('persistence', self.save_decoded_packet, 'persistence')
+        self.pipeline.start()
+
+        # The GUI sink runs on the main thread since Qt widgets can only be touched from there
+        self.display_timer = QtCore.QTimer(self)
+        self.display_timer.timeout.connect(self.display_decoded_packets)
+        self.display_timer.start(100)
+
     def write_gui_config_options_to_config_file(self):
         config = configparser.ConfigParser()
         config.read(self.config_filename)
@@ -240,13 +297,35 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.connected_port, port_readable = self.connect_to_serial_port()
         else:  # user chose TCP/IP socket
             self.connected_port, port_readable = self.connect_to_socket_port()
+        self.port_supervisor = PortSupervisor(self.connected_port, state_callbacks=[self.emit_port_state])
 
         if port_readable:
+            self.connected_port.set_decode_kiss(self.do_decode_kiss())
+            self.connected_port.set_ax25_filter(Ax25StationFilter(['CSIM']))  # Ignore other stations on the channel
+            self.connected_port.set_frame_checker(self.frame_checker)
+            self.setup_raw_capture()
             self.port_read_thread.start()
             self.display_gui_reading()
         else:
             self.display_gui_read_failed()
 
+    def setup_raw_capture(self):
+        # Everything read off the port, before framing, so data that framed wrong can still be looked at later
+        if not self.do_save_data():
+            return
+        self.ensure_output_folder_exists()
+        self.raw_capture = RawCaptureWriter(self.base_output_filename + "_raw.cap")
+        if self.user_chose_serial_port():
+            source_id = self.comboBox_serialPort.currentText()
+        else:
+            source_id = "{0}:{1}".format(self.lineEdit_ipAddress.text(), self.lineEdit_ipPort.text())
+        self.connected_port.set_raw_capture(self.raw_capture, source_id)
+
+    def close_raw_capture(self):
+        if self.raw_capture is not None:
+            self.raw_capture.close()
+            self.raw_capture = None
+
     def toggle_connect_button(self, is_currently_connect):
         if is_currently_connect:
             connect_button_text = 'Disconnect'
@@ -274,7 +353,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         ip_address = self.lineEdit_ipAddress.text()
         port = self.lineEdit_ipPort.text()
 
-        connect_socket = connect_port_get_packet.ConnectSocket(ip_address, port)
+        if self.do_decode_kiss():
+            connect_socket = connect_port_get_packet.ConnectKissSocket(ip_address, port)  # e.g., a software TNC
+        else:
+            connect_socket = connect_port_get_packet.ConnectSocket(ip_address, port)
         connected_port = connect_socket.connect_to_port()
         port_readable = connect_socket.port_readable
 
@@ -289,6 +371,24 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.label_socketStatus.setText(reading)
             self.label_socketStatus.setPalette(self.green_color)
 
+    def emit_port_state(self, old_state, state):
+        self.port_state_changed.emit(state)
+
+    def display_gui_port_state(self, state):
+        if state == port_supervisor.CONNECTED:
+            self.display_gui_reading()
+        elif state in (port_supervisor.DISCONNECTED, port_supervisor.CONNECTING):
+            self.display_gui_reconnecting()
+
+    def display_gui_reconnecting(self):
+        reconnecting = QApplication.translate("MainWindow", "Reconnecting", None, -1)
+        if self.user_chose_serial_port():
+            self.label_serialStatus.setText(reconnecting)
+            self.label_serialStatus.setPalette(self.yellow_color)
+        else:
+            self.label_socketStatus.setText(reconnecting)
+            self.label_socketStatus.setPalette(self.yellow_color)
+
     def display_gui_read_failed(self):
         read_failed = QApplication.translate("MainWindow", "Read failed", None, -1)
         if self.user_chose_serial_port:
@@ -305,6 +405,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.display_gui_port_closed()
 
         self.stop_read()
+        self.log.info("Port statistics: {}".format(self.port_supervisor.get_statistics()))
+        self.log.info("Framer statistics: {}".format(self.connected_port.get_framer_statistics()))
+        self.log.info("Pipeline statistics: {}".format(self.pipeline.get_statistics()))
+        self.log.info("Frame check statistics: {}".format(self.frame_checker.get_statistics()))
 
     def display_gui_port_closed(self):
         port_closed = QApplication.translate("MainWindow", "Port closed", None, -1)
@@ -334,30 +438,43 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.label_uploadStatus.setText("Upload status: Complete")
 
     def read_port(self):
+        # The supervisor rides out timeouts and reconnects by itself, so nothing comes back empty until it's stopped
         while True:
-            buffer_data = self.connected_port.read_packet()
+            buffer_data = self.port_supervisor.read_packet()
             if len(buffer_data) == 0:
-                continue
+                return
 
-            buffer_data = self.decode_kiss(buffer_data)
+            self.pipeline.queues['packets'].put(buffer_data)
 
-            buffer_data_hex_string = self.convert_buffer_data_to_hex_string(buffer_data)
-            self.display_gui_hex(buffer_data_hex_string)
+    def decode_packet(self, buffer_data):
+        buffer_data_hex_string = self.convert_buffer_data_to_hex_string(buffer_data)
+        telemetry = None
+        if self.frame_checker.check_packet(buffer_data):
+            telemetry = self.apid_demultiplexer.dispatch(buffer_data)
+        return DecodedPacket(buffer_data, buffer_data_hex_string, telemetry)
 
-            self.save_data_to_disk(buffer_data_hex_string, buffer_data)
+    def decode_beacon(self, buffer_data):
+        # Packets from the framer are copies, so the record can decode lazily on the display thread
+        return self.csim_decoder.decode_record(buffer_data)
 
-            csim_parser = CsimParser(buffer_data)
-            telemetry = csim_parser.parse_packet()
-            self.display_gui_telemetry(telemetry)
+    def decode_log_message(self, buffer_data):
+        log_message = LogMessageParser(buffer_data).parse_packet()
+        if log_message:
+            self.log.info("Spacecraft log message {0}: {1}".format(log_message['sequence_count'],
+                                                                    log_message['message']))
 
-    def decode_kiss(self, buffer_data):
-        # todo - fix for ax25
-        if self.do_decode_kiss():
-            # C0 is a special KISS character that get replaced; unreplace it
-            buffer_data = buffer_data.replace(bytearray([0xdb, 0xdc]), bytearray([0xc0]))
-            # DB is a special KISS character that get replaced; unreplace it
-            buffer_data = buffer_data.replace(bytearray([0xdb, 0xdd]), bytearray([0xdb]))
-        return buffer_data
+    def save_decoded_packet(self, decoded_packet):
+        self.save_data_to_disk(decoded_packet.hex_string, decoded_packet.packet)
+
+    def display_decoded_packets(self):
+        display_queue = self.pipeline.queues['display']
+        while True:
+            try:
+                decoded_packet = display_queue.get(block=False)
+            except (queue.Empty, pipeline.QueueClosed):
+                return
+            self.display_gui_hex(decoded_packet.hex_string)
+            self.display_gui_telemetry(decoded_packet.telemetry)
 
     def do_decode_kiss(self):
         return self.checkBox_decodeKiss.isChecked()
@@ -494,7 +611,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
 
     def stop_read(self):
-        self.connected_port.close()
+        self.port_supervisor.stop()
+        self.close_raw_capture()
 
     def save_data_toggled(self):
         if self.do_save_data():
@@ -521,10 +639,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.label_uploadStatus.setText("Upload status: Disabled")
 
     def decode_kiss_toggled(self):
+        if self.connected_port is not None:
+            self.connected_port.set_decode_kiss(self.do_decode_kiss())
         self.write_gui_config_options_to_config_file()
 
     def prepare_to_exit(self):
         self.log.info("About to quit.")
+        self.pipeline.stop(timeout=5)  # Lets anything still queued get saved
+        self.log.info("Pipeline statistics: {}".format(self.pipeline.get_statistics()))
+        self.log.info("Frame check statistics: {}".format(self.frame_checker.get_statistics()))
         self.upload_data()  # Only occurs if forward data is toggled on
         self.log.info("Closing CSIM Beacon Decoder.")
 
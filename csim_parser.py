@@ -5,15 +5,96 @@ __contact__ = "mattdhanley@gmail.com"
 from numpy import uint8, int16, uint16
 from find_sync_bytes import FindSyncBytes
 from logger import Logger
+import mmap
+import os
 import struct
+import sys
+import telemetry_dictionary
+
+# Field offsets, types and conversions live in the telemetry definition, not here
+BEACON_DEFINITION_FILENAME = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))),
+                                          'csim_beacon_telemetry.csv')  # _MEIPASS when bundled by pyinstaller
+BEACON_DECODER = telemetry_dictionary.load_decoder(BEACON_DEFINITION_FILENAME)
+
+
+def parse_packets(buffer, stride=None, fields=None):
+    """
+    Decodes every beacon in a buffer in one vectorized pass, e.g., a whole .dat archive, and returns
+    {name: numpy array with a value per beacon}. Beacons are found by their sync bytes unless stride [bytes] says
+    they're laid end to end from the start of the buffer. Pass fields (a list of names) to decode only those points,
+    e.g., ['bct_battery_voltage', 'bct_box1_temp'] for a plot of just those; no other bytes are read.
+    """
+    if stride is not None:
+        return BEACON_DECODER.decode_batch(buffer, stride=stride, fields=fields)
+    offsets = telemetry_dictionary.find_packet_offsets(buffer, FindSyncBytes().start_sync_bytes,
+                                                       BEACON_DECODER.packet_length)
+    return BEACON_DECODER.decode_batch(buffer, offsets=offsets, fields=fields)
+
+
+def parse_dat_file(filename, fields=None):
+    # Memory maps the file so the OS pages it in as it's read instead of it all being loaded first
+    with open(filename, 'rb') as dat_file:
+        if os.fstat(dat_file.fileno()).st_size == 0:
+            return parse_packets(bytes(), fields=fields)  # Can't map an empty file
+        with mmap.mmap(dat_file.fileno(), 0, access=mmap.ACCESS_READ) as dat_map:
+            return parse_packets(dat_map, fields=fields)
+
+
+class CsimDecoder:
+    """
+    Long lived beacon decoder. Everything (logger, sync bytes, compiled layout) is set up once in the constructor, so
+    decode() does one sync search and one unpack per packet and never touches the filesystem unless a packet is bad.
+    Holds no per-packet state, so one instance can be shared by every thread.
+    """
+    def __init__(self, telemetry_decoder=None):
+        self.telemetry_decoder = telemetry_decoder if telemetry_decoder is not None else BEACON_DECODER
+        self.fsb = FindSyncBytes()
+        self.sync_bytes = bytes(self.fsb.start_sync_bytes)
+        self.log = Logger().create_log()
+
+    def decode(self, buffer, fields=None):
+        """
+        Returns decoded telemetry as a dictionary, or None if buffer doesn't hold a whole beacon. Pass fields (a list
+        of names) to decode only those points.
+        """
+        sync_start_index = self.find_beacon_start(buffer)
+        if sync_start_index is None:
+            return None
+        return self.telemetry_decoder.decode(buffer, sync_start_index, fields)
+
+    def decode_record(self, buffer):
+        """
+        Like decode, but returns a TelemetryRecord that only decodes the points that are read. Cheaper whenever most
+        points go unused, e.g., for a display or an archive scan after a few values. buffer must not change while
+        the record is in use.
+        """
+        sync_start_index = self.find_beacon_start(buffer)
+        if sync_start_index is None:
+            return None
+        return self.telemetry_decoder.record(buffer, sync_start_index)
+
+    def find_beacon_start(self, buffer):
+        # Index of the sync bytes, or None if buffer doesn't hold a whole beacon
+        if buffer[0:len(self.sync_bytes)] == self.sync_bytes:
+            sync_start_index = 0  # Framed packets always start at the sync, so usually there's nothing to search
+        else:
+            sync_start_index = self.fsb.find_sync_start_index(buffer)
+            if sync_start_index == -1:
+                self.log.error('Invalid packet detected. No sync start pattern found. Returning.')
+                return None
+        if len(buffer) - sync_start_index < self.telemetry_decoder.packet_length:
+            self.log.error('Invalid packet detected. Too short to hold the beacon. Returning.')
+            return None
+        return sync_start_index
 
 
 class CsimParser:
     def __init__(self, csim_packet):
-        self.csim_packet = csim_packet  # [bytearray]: Un-decoded data to be parsed
+        self.csim_packet = csim_packet  # [bytes-like]: Un-decoded data to be parsed. A memoryview is used as is.
         self.log = Logger().create_log()
-        # todo - make more elegant. For now, 400 works.
-        self.expected_packet_length = 400
+        # Packets are cut to their CCSDS length by the framer; this is just how far in parse_packet reads
+        self.expected_packet_length = BEACON_DECODER.packet_length
+        self.sync_start_index = None
 
     def parse_packet(self):
         """
@@ -22,50 +103,19 @@ class CsimParser:
         if not self.is_valid_packet():
             return None
 
-        self.ensure_packet_starts_at_sync()
-        telemetry = dict()
-
-        # Note: The [n: n + 2] instead of [n: n + 1] is because python slicing cuts short
-        # e.g., to get bytes at indices 3 and 4, you don't do minxss_packet[3:4], you have to do csim_packet[3:5]
-        # todo - update all of this
-        # The telem points that are commented out still need unique functions. The rest of them use 
-        #the new general decode function. It hasn't been tested so mileage may vary. 
-        telemetry['bct_adcs_mode'] = self.decode_general(self.csim_packet[165], 1, 'dn')                    # [Unitless]
-        telemetry['bct_tai_seconds'] = self.decode_general(self.csim_packet[55:63], 8, 'double')
-        telemetry['bct_time_valid'] = self.decode_general(self.csim_packet[63], 1, 'dn')
-        telemetry['bct_Q_BODY_WRT_ECI1'] = self.decode_general(self.csim_packet[127:131], 4, 'sn', conversion=5e-10)
-        telemetry['bct_Q_BODY_WRT_ECI2'] = self.decode_general(self.csim_packet[131:135], 4, 'sn', conversion=5e-10)
-        telemetry['bct_Q_BODY_WRT_ECI3'] = self.decode_general(self.csim_packet[135:139], 4, 'sn', conversion=5e-10)
-        telemetry['bct_Q_BODY_WRT_ECI4'] = self.decode_general(self.csim_packet[139:143], 4, 'sn', conversion=5e-10)
-        telemetry['attitude_valid_label'] = self.decode_general(self.csim_packet[167], 1, 'dn')
-        telemetry['bct_filtered_speed_rpm1'] = self.decode_general(self.csim_packet[180:182], 2, 'sn', conversion=4e-1)
-        telemetry['bct_filtered_speed_rpm2'] =self.decode_general(self.csim_packet[182:184], 2, 'sn', conversion=4e-1)
-        telemetry['bct_filtered_speed_rpm3'] =self.decode_general(self.csim_packet[184:186], 2, 'sn', conversion=4e-1)
-        telemetry['bct_position_error1'] =self.decode_general(self.csim_packet[195:199], 4, 'sn', conversion=2e-9)
-        telemetry['bct_position_error2'] =self.decode_general(self.csim_packet[199:203], 4, 'sn', conversion=2e-9)
-        telemetry['bct_position_error3'] =self.decode_general(self.csim_packet[203:207], 4, 'sn', conversion=2e-9)
-        telemetry['bct_box1_temp'] =self.decode_general(self.csim_packet[305:307], 2, 'sn', conversion=5e-3)
-        telemetry['bct_bus_voltage'] =self.decode_general(self.csim_packet[315:317], 2,'sn', conversion=1e-3)
-        telemetry['bct_voltage_12p0'] =self.decode_general(self.csim_packet[299], 1,'dn', conversion=1e-1)
-        telemetry['bct_battery_voltage'] =self.decode_general(self.csim_packet[317:319], 2, 'sn', conversion=2e-3)
-        telemetry['bct_battery_current'] =self.decode_general(self.csim_packet[319:321], 2, 'sn', conversion=2e-3)
-        telemetry['bct_battery1_temp'] =self.decode_general(self.csim_packet[321:323], 2, 'sn', conversion=5e-3)
-        telemetry['bct_battery1_temp'] =self.decode_general(self.csim_packet[323:325], 2, 'sn', conversion=5e-3)
-        #todo telemetry['bct_gps_valid'] =self.decode_general(self.csim_packet[275:276], 1, 'dn')
-        #todo telemetry['bct_sdr_temp'] =self.decode_general(self.csim_packet[299:300], 1, 'sn')
-        telemetry['bct_mag_vector_body1'] =self.decode_general(self.csim_packet[244:246], 2, 'sn', conversion=5e-9)
-        telemetry['bct_mag_vector_body2'] =self.decode_general(self.csim_packet[246:248], 2, 'sn', conversion=5e-9)
-        telemetry['bct_mag_vector_body3'] =self.decode_general(self.csim_packet[248:250], 2, 'sn', conversion=5e-9)
-
-        return telemetry
+        return BEACON_DECODER.decode(self.csim_packet, self.sync_start_index)
 
     def is_valid_packet(self):
         fsb = FindSyncBytes()
         sync_start_index = fsb.find_sync_start_index(self.csim_packet)
+        self.sync_start_index = sync_start_index
 
         if sync_start_index == -1:
             self.log.error('Invalid packet detected. No sync start pattern found. Returning.')
             return False
+        if len(self.csim_packet) - sync_start_index < self.expected_packet_length:
+            self.log.error('Invalid packet detected. Too short to hold the beacon. Returning.')
+            return False
         return True
 
     def ensure_packet_starts_at_sync(self):
@@ -6,10 +6,17 @@ class FindSyncBytes:
         # self.stop_sync_bytes = bytearray([0x84, 0x04])  # TODO - FIGURE THIS OUT. I DON'T THINK I NEED IT
 
     def find_log_sync_start_index(self, packets):
-        return bytearray(packets).find(self.log_sync_bytes)
+        return self.as_searchable(packets).find(self.log_sync_bytes)
 
     def find_sync_start_index(self, packets):
-        return bytearray(packets).find(self.start_sync_bytes)
+        return self.as_searchable(packets).find(self.start_sync_bytes)
+
+    @staticmethod
+    def as_searchable(packets):
+        # bytes and bytearray can be searched as they are; anything else (e.g., a memoryview) has to be copied
+        if isinstance(packets, (bytes, bytearray)):
+            return packets
+        return bytes(packets)
 
     # def find_sync_stop_index(self, packets):
     #     return bytearray(packets).find(self.stop_sync_bytes)
@@ -0,0 +1,109 @@
+"""Check frame integrity before anything gets decoded"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import binascii
+from logger import Logger
+
+FCS_LENGTH = 2  # [bytes] AX.25 frame check sequence, sent least significant byte first
+
+
+def reverse_bits(byte):
+    return int('{:08b}'.format(byte)[::-1], 2)
+
+
+REVERSED_BITS_TABLE = bytes(reverse_bits(byte) for byte in range(256))
+
+
+def build_crc16_x25_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC16_X25_TABLE = build_crc16_x25_table()
+
+
+def crc16_x25(data):
+    """
+    CRC-16/X.25 (the AX.25 FCS): reflected polynomial 0x1021, initial value 0xFFFF, final XOR 0xFFFF.
+    binascii.crc_hqx does the same polynomial unreflected in C, so the bytes go through a bit reversal lookup table
+    first and the result is reflected back. Runs at hundreds of MB/s compared to a few for a Python loop.
+    """
+    crc = binascii.crc_hqx(bytes(data).translate(REVERSED_BITS_TABLE), 0xFFFF)
+    return ((REVERSED_BITS_TABLE[crc & 0xFF] << 8) | REVERSED_BITS_TABLE[crc >> 8]) ^ 0xFFFF
+
+
+def crc16_x25_bytewise(data):
+    # Textbook one table lookup per byte. Same answer as crc16_x25, for checking it and for reference.
+    crc = 0xFFFF
+    for byte in memoryview(data).cast('B'):
+        crc = (crc >> 8) ^ CRC16_X25_TABLE[(crc ^ byte) & 0xFF]
+    return crc ^ 0xFFFF
+
+
+def has_valid_fcs(frame):
+    frame_view = memoryview(frame)
+    if len(frame_view) <= FCS_LENGTH:
+        return False
+    received_fcs = frame_view[-2] | (frame_view[-1] << 8)
+    return crc16_x25(frame_view[:-FCS_LENGTH]) == received_fcs
+
+
+class FrameChecker:
+    """
+    Input:
+        check_fcs [bool]: Whether AX.25 frames still carry their FCS. Most KISS TNCs check and strip it themselves,
+                          so only turn this on for ones that pass it through.
+        packet_checks [list]: Functions taking a packet and returning True if it's intact, e.g., a mission checksum
+        failed_frame_filename [str]: If given, every frame or packet that fails is appended here for later study
+    """
+    def __init__(self, check_fcs=False, packet_checks=(), failed_frame_filename=None):
+        self.check_fcs = check_fcs
+        self.packet_checks = list(packet_checks)
+        self.failed_frame_filename = failed_frame_filename
+        self.log = Logger().create_log()
+
+        self.frames_passed = 0
+        self.frames_failed = 0
+        self.packets_passed = 0
+        self.packets_failed = 0
+
+    def check_ax25_frame(self, frame):
+        """
+        Returns the frame with its FCS removed if it checks out (or as is if FCS checking is off), otherwise None
+        """
+        if not self.check_fcs:
+            return frame
+
+        if not has_valid_fcs(frame):
+            self.frames_failed += 1
+            self.archive_failed(frame)
+            return None
+        self.frames_passed += 1
+        return memoryview(frame)[:-FCS_LENGTH]
+
+    def check_packet(self, packet):
+        for packet_check in self.packet_checks:
+            if not packet_check(packet):
+                self.packets_failed += 1
+                self.log.warning("Packet failed {}; not decoding it.".format(getattr(packet_check, '__name__',
+                                                                                     packet_check)))
+                self.archive_failed(packet)
+                return False
+        self.packets_passed += 1
+        return True
+
+    def archive_failed(self, frame):
+        if self.failed_frame_filename is None:
+            return
+        with open(self.failed_frame_filename, 'ab') as failed_frame_file:
+            failed_frame_file.write(frame)
+
+    def get_statistics(self):
+        return {'frames_passed': self.frames_passed, 'frames_failed': self.frames_failed,
+                'packets_passed': self.packets_passed, 'packets_failed': self.packets_failed}
@@ -0,0 +1,103 @@
+"""Read many serial ports and TCP/IP sockets at once and merge their packets into one queue"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import queue
+import selectors
+import time
+from collections import namedtuple
+from logger import Logger
+
+# One framed packet along with where and when it came in. receive_time is from time.time().
+IngestedPacket = namedtuple('IngestedPacket', ['source_id', 'receive_time', 'packet'])
+
+
+class SourceStatistics:
+    def __init__(self):
+        self.bytes_received = 0
+        self.packets_framed = 0
+
+    def as_dict(self):
+        return {'bytes_received': self.bytes_received, 'packets_framed': self.packets_framed}
+
+
+class IngestManager:
+    """
+    Watches any number of connected PacketReaders (ConnectSerial, ConnectSocket, ...) with a single selector.
+    Each source keeps its own framer (and KISS deframer, if set) so a packet split across reads on one radio is never
+    mixed with another's bytes.
+    Sources need a fileno(), so serial ports are only supported on platforms where select works on them (not Windows).
+    """
+    def __init__(self, packet_queue=None):
+        self.log = Logger().create_log()
+        self.selector = selectors.DefaultSelector()
+        self.packet_queue = packet_queue if packet_queue is not None else queue.Queue()
+        self.sources = {}
+        self.source_statistics = {}
+        self.running = False
+
+    def add_source(self, source_id, source):
+        if source_id in self.sources:
+            raise ValueError('Source id {} is already being read.'.format(source_id))
+
+        self.selector.register(source.fileno(), selectors.EVENT_READ, source_id)
+        self.sources[source_id] = source
+        self.source_statistics[source_id] = SourceStatistics()
+        self.log.info("Ingesting from source {}.".format(source_id))
+
+    def remove_source(self, source_id):
+        source = self.sources.pop(source_id)
+        self.selector.unregister(source.fileno())
+        self.log.info("Stopped ingesting from source {}.".format(source_id))
+        return source
+
+    def poll(self, timeout=None):
+        """
+        Wait up to timeout [s] for any source to have data, then read and frame everything that's ready.
+        Returns the number of packets put on the queue.
+        """
+        number_of_packets = 0
+        for key, _ in self.selector.select(timeout):
+            source_id = key.data
+            source = self.sources[source_id]
+            try:
+                buffered_data = source.read_data()
+            except OSError as error:  # Includes serial.SerialException, e.g., from an unplugged radio
+                self.log.error("Read from source {0} failed: {1}".format(source_id, error))
+                self.remove_source(source_id).close()
+                continue
+            receive_time = time.time()
+
+            if len(buffered_data) == 0:
+                if source.connectionless:
+                    continue  # An empty UDP datagram; there's no other end to go away
+                # Readable with nothing to read means the other end went away
+                self.remove_source(source_id).close()
+                continue
+
+            statistics = self.source_statistics[source_id]
+            statistics.bytes_received += len(buffered_data)
+            for packet in source.frame_data(buffered_data):
+                statistics.packets_framed += 1
+                number_of_packets += 1
+                self.packet_queue.put(IngestedPacket(source_id, receive_time, packet))
+
+        return number_of_packets
+
+    def run(self, poll_interval=0.1):
+        # Blocks until stop() is called (e.g., from another thread) or every source has gone away
+        self.running = True
+        while self.running and self.sources:
+            self.poll(poll_interval)
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def get_statistics(self):
+        return {source_id: statistics.as_dict() for source_id, statistics in self.source_statistics.items()}
+
+    def close(self):
+        for source_id in list(self.sources):
+            self.remove_source(source_id).close()
+        self.selector.close()
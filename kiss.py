@@ -0,0 +1,117 @@
+"""Decode KISS TNC framing from a byte stream"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+from collections import namedtuple
+
+FEND = 0xC0  # Frame end, also marks the start of the next frame
+FESC = 0xDB  # Frame escape
+TFEND = 0xDC  # Transposed frame end; FESC TFEND stands for a literal FEND
+TFESC = 0xDD  # Transposed frame escape; FESC TFESC stands for a literal FESC
+
+DATA_FRAME = 0x00  # Command nibble of frames that carry data to/from the radio
+
+# port and command are the high and low nibbles of the byte that follows FEND
+KissFrame = namedtuple('KissFrame', ['port', 'command', 'payload'])
+
+HUNTING = 0  # Waiting for the first FEND; anything before it is line noise
+IN_FRAME = 1
+ESCAPED = 2  # The previous byte was FESC
+
+
+class KissDeframer:
+    """
+    Single pass over the incoming stream. Runs of ordinary bytes are located with bytes.find and copied in one go,
+    so Python only steps through the FEND and FESC bytes themselves. State carries over between calls to feed,
+    so frames and escape sequences can be split across reads anywhere.
+    """
+    def __init__(self):
+        self.state = HUNTING
+        self.frame = bytearray()
+        self.frames_decoded = 0
+        self.frames_dropped = 0  # Frames thrown away for a bad escape sequence
+
+    def feed(self, data):
+        """
+        Decode newly received bytes and return a list of the KissFrames they complete
+        """
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+
+        frames = []
+        position = 0
+        length = len(data)
+        fend_index = None  # Next FEND at or after position, -1 once there are none left in data
+        while position < length:
+            if self.state == HUNTING:
+                fend_index = data.find(FEND, position)
+                if fend_index == -1:
+                    break
+                position = fend_index + 1
+                self.state = IN_FRAME
+
+            elif self.state == ESCAPED:
+                escaped_byte = data[position]
+                position += 1
+                if escaped_byte == TFEND:
+                    self.frame.append(FEND)
+                    self.state = IN_FRAME
+                elif escaped_byte == TFESC:
+                    self.frame.append(FESC)
+                    self.state = IN_FRAME
+                else:
+                    self.drop_frame()
+                    if escaped_byte == FEND:
+                        self.state = IN_FRAME  # That FEND still opens the next frame
+
+            else:
+                if fend_index is None or -1 < fend_index < position:
+                    fend_index = data.find(FEND, position)
+                end_index = fend_index if fend_index != -1 else length
+                fesc_index = data.find(FESC, position, end_index)
+                if fesc_index != -1:
+                    self.frame += data[position:fesc_index]
+                    position = fesc_index + 1
+                    self.state = ESCAPED
+                    continue
+
+                self.frame += data[position:end_index]
+                if fend_index == -1:
+                    break
+                position = fend_index + 1
+                self.finish_frame(frames)
+
+        return frames
+
+    def finish_frame(self, frames):
+        # FEND both closes this frame and opens the next one, so stay IN_FRAME
+        if len(self.frame) == 0:
+            return  # Back to back FENDs are just padding
+
+        command_byte = self.frame[0]
+        with memoryview(self.frame) as view:
+            payload = bytes(view[1:])
+        self.frame = bytearray()
+        self.frames_decoded += 1
+        frames.append(KissFrame(command_byte >> 4, command_byte & 0x0F, payload))
+
+    def drop_frame(self):
+        self.frame = bytearray()
+        self.frames_dropped += 1
+        self.state = HUNTING
+
+    def reset(self):
+        self.frame = bytearray()
+        self.state = HUNTING
+
+
+def encode_kiss_frame(payload, port=0, command=DATA_FRAME):
+    if not (0 <= port <= 0x0F and 0 <= command <= 0x0F):
+        raise ValueError('KISS port and command must each fit in a nibble (0-15). Was passed {0} and {1}'.format(
+            port, command))
+    # The type byte is escaped along with the payload, since port 12 data frames (0xC0) and port 13 command 11
+    # (0xDB) would otherwise look like FEND and FESC. FESC has to be escaped first so the FESCs introduced for FEND
+    # aren't escaped again.
+    frame = bytes([(port << 4) | command]) + bytes(payload)
+    escaped_frame = frame.replace(bytes([FESC]), bytes([FESC, TFESC])).replace(bytes([FEND]), bytes([FESC, TFEND]))
+    return bytes([FEND]) + escaped_frame + bytes([FEND])
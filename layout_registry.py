@@ -0,0 +1,138 @@
+"""Pick the compiled telemetry decoder for each packet by its sync word, APID and spacecraft ID, across missions"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import os
+from collections import Counter, namedtuple
+import ccsds
+import csim_parser
+from find_sync_bytes import FindSyncBytes
+from logger import Logger
+import telemetry_dictionary
+
+# Other packages add missions by declaring an entry point in this group. Each entry point is a function taking no
+# arguments and returning a list of PacketLayouts, e.g., [make_layout('MySat', b'\x08\x42', 'mysat_beacon.csv')].
+ENTRY_POINT_GROUP = 'csim_beacon_decoder.packet_layouts'
+
+SYNC_WORD_LENGTH = 2  # [bytes] The CCSDS packet ID word every registered packet starts with
+
+MINXSS_DEFINITION_FILENAME = os.path.join(os.path.dirname(csim_parser.BEACON_DEFINITION_FILENAME),
+                                          'minxss_beacon_telemetry.csv')
+
+# spacecraft_id None matches any spacecraft with that sync word and APID. spacecraft_id_field names the point that
+# holds the spacecraft ID, for missions where several spacecraft share a sync word and APID; None if there's just one.
+PacketLayout = namedtuple('PacketLayout', ['mission', 'sync_word', 'apid', 'spacecraft_id', 'decoder',
+                                           'spacecraft_id_field'])
+
+
+def make_layout(mission, sync_word, definition_filename, spacecraft_id=None, spacecraft_id_field=None):
+    # The APID comes from the sync word, since it's part of the packet ID word
+    decoder = telemetry_dictionary.load_decoder(definition_filename)
+    return PacketLayout(mission, bytes(sync_word), ccsds.get_apid(sync_word), spacecraft_id, decoder,
+                        spacecraft_id_field)
+
+
+class LayoutRegistry:
+    """
+    Packet layouts keyed by (sync word, APID, spacecraft ID), so finding a packet's decoder is a dict lookup or two
+    (plus reading the spacecraft ID, for missions that have one) however many missions are registered.
+    Packets are expected to start at their sync word, as they come from the framer.
+    """
+    def __init__(self):
+        self.log = Logger().create_log()
+        self.layouts = {}
+        self.spacecraft_id_fields = {}  # (sync word, APID): (decoder, name of the spacecraft ID point)
+        self.packet_counts = Counter()  # Packets decoded, keyed by mission
+        self.packets_unknown = 0
+        self.packets_too_short = 0
+
+    def register(self, layout):
+        key = (layout.sync_word, layout.apid, layout.spacecraft_id)
+        if key in self.layouts:
+            raise ValueError('{0} is already registered for sync word {1}, APID {2}, spacecraft ID {3}.'.format(
+                self.layouts[key].mission, layout.sync_word.hex(), layout.apid, layout.spacecraft_id))
+        self.layouts[key] = layout
+        if layout.spacecraft_id_field is not None:
+            self.spacecraft_id_fields[(layout.sync_word, layout.apid)] = (layout.decoder, layout.spacecraft_id_field)
+        self.log.info("Registered {0} packet layout for sync word {1}, APID {2}, spacecraft ID {3}.".format(
+            layout.mission, layout.sync_word.hex(), layout.apid, layout.spacecraft_id))
+
+    def lookup(self, packet):
+        """
+        Returns the PacketLayout for a packet, or None if no mission registered one for it
+        """
+        if len(packet) < SYNC_WORD_LENGTH:
+            return None
+        sync_word = bytes(packet[:SYNC_WORD_LENGTH])
+        apid = ccsds.get_apid(packet)
+
+        spacecraft_id = None
+        spacecraft_id_field = self.spacecraft_id_fields.get((sync_word, apid))
+        if spacecraft_id_field is not None:
+            decoder, name = spacecraft_id_field
+            if len(packet) >= decoder.packet_length:
+                spacecraft_id = int(decoder.decode_point(packet, name))
+            layout = self.layouts.get((sync_word, apid, spacecraft_id))
+            if layout is not None:
+                return layout
+        return self.layouts.get((sync_word, apid, None))
+
+    def decode(self, packet, fields=None):
+        """
+        Returns (mission, telemetry dictionary) for a packet, or None if no mission registered its layout or it's
+        too short for it. fields are passed on to the decoder to decode only those points.
+        """
+        layout = self.lookup(packet)
+        if layout is None:
+            self.packets_unknown += 1
+            return None
+        if len(packet) < layout.decoder.packet_length:
+            self.packets_too_short += 1
+            self.log.error('Invalid {} packet detected. Too short to hold the beacon. Returning.'.format(
+                layout.mission))
+            return None
+        self.packet_counts[layout.mission] += 1
+        return layout.mission, layout.decoder.decode(packet, 0, fields)
+
+    def load_plugins(self, group=ENTRY_POINT_GROUP):
+        # A broken plugin is logged and skipped rather than stopping the missions that do load
+        for entry_point in find_entry_points(group):
+            try:
+                layouts = list(entry_point.load()())
+                for layout in layouts:
+                    self.register(layout)
+            except Exception as error:
+                self.log.warning("Couldn't load packet layouts from plugin {0}: {1}".format(entry_point.name, error))
+
+    def get_statistics(self):
+        return {'packet_counts': dict(self.packet_counts), 'packets_unknown': self.packets_unknown,
+                'packets_too_short': self.packets_too_short}
+
+
+def find_entry_points(group):
+    try:
+        import importlib.metadata as importlib_metadata
+    except ImportError:  # Before Python 3.8 it's the importlib_metadata backport, if installed
+        try:
+            import importlib_metadata
+        except ImportError:
+            return []
+    entry_points = importlib_metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+    return list(entry_points.get(group, []))  # Python 3.8 and 3.9 give a dict keyed by group
+
+
+def make_default_registry(load_plugins=True):
+    """
+    CSIM and MinXSS beacons, plus any missions installed as plugins
+    """
+    registry = LayoutRegistry()
+    csim_sync_word = bytes(FindSyncBytes().start_sync_bytes)
+    registry.register(PacketLayout('CSIM', csim_sync_word, ccsds.get_apid(csim_sync_word), None,
+                                   csim_parser.BEACON_DECODER, None))
+    registry.register(make_layout('MinXSS', b'\x08\x19', MINXSS_DEFINITION_FILENAME,
+                                  spacecraft_id_field='FlightModel'))
+    if load_plugins:
+        registry.load_plugins()
+    return registry
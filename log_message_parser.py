@@ -0,0 +1,27 @@
+"""Parse CSIM real time log message packets"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import ccsds
+
+
+class LogMessageParser:
+    def __init__(self, log_packet):
+        self.log_packet = log_packet  # [bytes-like]: One log message packet, starting at its primary header
+
+    def parse_packet(self):
+        """
+        Returns the message as a dictionary with its APID and sequence count
+        """
+        if len(self.log_packet) < ccsds.PRIMARY_HEADER_LENGTH:
+            return None
+
+        header = ccsds.parse_primary_header(self.log_packet)
+        message_bytes = bytes(self.log_packet[ccsds.PRIMARY_HEADER_LENGTH:ccsds.get_packet_length(header)])
+
+        log_message = dict()
+        log_message['apid'] = header.apid
+        log_message['sequence_count'] = header.sequence_count
+        # Flight software pads messages with NULs; anything else that isn't text shows up as a replacement character
+        log_message['message'] = message_bytes.rstrip(b'\x00').decode('ascii', 'replace')
+        return log_message
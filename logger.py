@@ -10,10 +10,10 @@ class Logger:
         """
         For debugging and informational purposes.
         """
-        self.ensure_log_folder_exists()
         log = logging.getLogger('csim_beacon_decoder_debug')
 
-        if not self.logger_exists(log):
+        if not self.logger_exists(log):  # Only the first call touches the filesystem
+            self.ensure_log_folder_exists()
             handler = logging.FileHandler(self.create_log_filename())
             formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
             handler.setFormatter(formatter)
@@ -1 +1 @@
-pyinstaller csim_beacon_decoder.py --onefile -n CSIM_Beacon_DecoderWin --clean --windowed --noconfirm
\ No newline at end of file
+pyinstaller csim_beacon_decoder.py --onefile -n CSIM_Beacon_DecoderWin --clean --windowed --noconfirm --add-data "csim_beacon_telemetry.csv;."
\ No newline at end of file
@@ -1,2 +1,2 @@
 #!/bin/bash
-pyinstaller csim_beacon_decoder.py --onefile -n MinXSS_Beacon_DecoderMac --clean --windowed --noconfirm
+pyinstaller csim_beacon_decoder.py --onefile -n MinXSS_Beacon_DecoderMac --clean --windowed --noconfirm --add-data "csim_beacon_telemetry.csv:."
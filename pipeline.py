@@ -0,0 +1,165 @@
+"""Bounded queues and worker threads that decouple port reading from decoding, saving and display"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import queue
+import threading
+from collections import deque
+from logger import Logger
+
+# What put does when a queue is full
+BLOCK = 'block'  # Wait for room; slows the producer down to the consumer's pace
+DROP_OLDEST = 'drop_oldest'  # Make room by throwing away the item that's been waiting longest
+DROP_NEWEST = 'drop_newest'  # Throw away the item being put
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class BoundedQueue:
+    """
+    Thread safe FIFO with a fixed size, an overflow policy and counters. get/put follow queue.Queue (queue.Empty and
+    queue.Full on timeout) with one addition: once close() is called, get raises QueueClosed when nothing is left.
+    """
+    def __init__(self, max_size, overflow_policy=BLOCK):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError('Overflow policy must be one of {0}. Was passed {1}'.format(OVERFLOW_POLICIES,
+                                                                                        overflow_policy))
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+        self.items_put = 0
+        self.items_dropped = 0
+        self.max_depth = 0
+
+    def put(self, item, block=True, timeout=None):
+        # Returns False if the item (not some other one) was dropped
+        with self.condition:
+            if len(self.items) >= self.max_size:
+                if self.overflow_policy == DROP_NEWEST:
+                    self.items_dropped += 1
+                    return False
+                elif self.overflow_policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.items_dropped += 1
+                elif not block or not self.condition.wait_for(lambda: len(self.items) < self.max_size or self.closed,
+                                                              timeout):
+                    raise queue.Full
+
+            self.items.append(item)
+            self.items_put += 1
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify_all()
+            return True
+
+    def get(self, block=True, timeout=None):
+        with self.condition:
+            if block:
+                self.condition.wait_for(lambda: self.items or self.closed, timeout)
+            if not self.items:
+                if self.closed:
+                    raise QueueClosed
+                raise queue.Empty
+
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        # Consumers still get everything already queued before seeing QueueClosed
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def depth(self):
+        with self.condition:
+            return len(self.items)
+
+    def get_statistics(self):
+        with self.condition:
+            return {'depth': len(self.items), 'max_depth': self.max_depth, 'items_put': self.items_put,
+                    'items_dropped': self.items_dropped}
+
+
+class PipelineStage(threading.Thread):
+    """
+    Worker that takes items off one queue, hands them to handler, and puts any result that isn't None on each of
+    its output queues. Stops once its input queue is closed and empty.
+    """
+    def __init__(self, name, handler, input_queue, output_queues=()):
+        super(PipelineStage, self).__init__(name=name, daemon=True)
+        self.handler = handler
+        self.input_queue = input_queue
+        self.output_queues = list(output_queues)
+        self.log = Logger().create_log()
+
+        self.items_handled = 0
+        self.errors = 0
+
+    def run(self):
+        while True:
+            try:
+                item = self.input_queue.get()
+            except QueueClosed:
+                break
+
+            try:
+                result = self.handler(item)
+            except Exception as error:  # One bad packet shouldn't take the whole stage down
+                self.errors += 1
+                self.log.exception("Pipeline stage {0} failed on an item: {1}".format(self.name, error))
+                continue
+
+            self.items_handled += 1
+            if result is not None:
+                for output_queue in self.output_queues:
+                    output_queue.put(result)
+
+        for output_queue in self.output_queues:
+            output_queue.close()
+
+
+class Pipeline:
+    """
+    Named queues joined by stages. Queues are added first, then the stages that connect them, e.g.,
+        pipeline.add_queue('packets', 1000, DROP_OLDEST)
+        pipeline.add_queue('decoded', 100)
+        pipeline.add_stage('decode', decode_packet, 'packets', ['decoded'])
+    The producer feeding the first queue and the consumer draining the last one live outside the pipeline.
+    """
+    def __init__(self):
+        self.queues = {}
+        self.stages = []
+
+    def add_queue(self, name, max_size, overflow_policy=BLOCK):
+        self.queues[name] = BoundedQueue(max_size, overflow_policy)
+        return self.queues[name]
+
+    def add_stage(self, name, handler, input_queue_name, output_queue_names=()):
+        stage = PipelineStage(name, handler, self.queues[input_queue_name],
+                              [self.queues[queue_name] for queue_name in output_queue_names])
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=None):
+        # Closing the queues nothing in the pipeline feeds lets every stage finish what's queued, in order
+        fed_queues = set(id(output_queue) for stage in self.stages for output_queue in stage.output_queues)
+        for pipeline_queue in self.queues.values():
+            if id(pipeline_queue) not in fed_queues:
+                pipeline_queue.close()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def get_statistics(self):
+        return {'queues': {name: pipeline_queue.get_statistics() for name, pipeline_queue in self.queues.items()},
+                'stages': {stage.name: {'items_handled': stage.items_handled, 'errors': stage.errors}
+                           for stage in self.stages}}
@@ -0,0 +1,153 @@
+"""Keep a port connected: notice when it drops and reconnect with backoff"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import random
+import threading
+from logger import Logger
+
+# Connection states
+CONNECTED = 'connected'
+DISCONNECTED = 'disconnected'  # Lost the connection and waiting to try again
+CONNECTING = 'connecting'
+STOPPED = 'stopped'
+
+# What happens to a packet that was partway through the framer when the connection dropped
+DROP_PARTIAL = 'drop'  # It's gone; start clean on the new connection
+KEEP_PARTIAL = 'keep'  # Let the bytes after the reconnect finish it, e.g., a serial cable bumped loose mid beacon
+PARTIAL_PACKET_POLICIES = (DROP_PARTIAL, KEEP_PARTIAL)
+
+
+class ConnectionLost(ConnectionError):
+    pass
+
+
+class ExponentialBackoff:
+    """
+    Delays that grow by multiplier after every failed attempt up to max_delay. Each is scaled by a random factor
+    within +/- jitter so receivers that lost the same server don't all come back at the same moment.
+    """
+    def __init__(self, initial_delay=0.5, max_delay=60.0, multiplier=2.0, jitter=0.25):
+        self.initial_delay = initial_delay  # [s]
+        self.max_delay = max_delay  # [s]
+        self.multiplier = multiplier
+        self.jitter = jitter  # Fraction of the delay
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = min(self.initial_delay * self.multiplier ** self.attempts, self.max_delay)
+        self.attempts += 1
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class PortSupervisor:
+    """
+    Wraps a port (ConnectSerial, ConnectSocket, ...) so read_packet() only ever hands back a packet, or empty bytes
+    once stop() has been called. Read timeouts are waited through, and a peer closing the connection or a read error
+    (e.g., an unplugged radio) sets off reconnect attempts spaced out by the backoff instead of a busy loop.
+    Input:
+        port: A port object, connected or not
+        backoff [ExponentialBackoff]: Spacing between reconnect attempts
+        partial_packet_policy [str]: DROP_PARTIAL or KEEP_PARTIAL
+        state_callbacks [list]: Functions called with (old_state, new_state) on every connection state change. They
+                                run on whichever thread is reading, so GUIs should pass the change on to their own.
+    """
+    def __init__(self, port, backoff=None, partial_packet_policy=DROP_PARTIAL, state_callbacks=()):
+        if partial_packet_policy not in PARTIAL_PACKET_POLICIES:
+            raise ValueError('Partial packet policy must be one of {0}. Was passed {1}'.format(
+                PARTIAL_PACKET_POLICIES, partial_packet_policy))
+        self.port = port
+        self.backoff = backoff if backoff is not None else ExponentialBackoff()
+        self.partial_packet_policy = partial_packet_policy
+        self.state_callbacks = list(state_callbacks)
+        self.log = Logger().create_log()
+
+        self.state = CONNECTED if port.port_readable else DISCONNECTED
+        self.stop_event = threading.Event()
+
+        self.connections_lost = 0
+        self.reconnects = 0
+
+    def read_packet(self):
+        while not self.stop_event.is_set():
+            if self.state != CONNECTED and not self.reconnect():
+                continue
+            try:
+                packet = self.read_port_packet()
+            except ConnectionLost as error:
+                if not self.stop_event.is_set():
+                    self.connection_lost(error)
+                continue
+            if len(packet) > 0:
+                return packet
+        return bytes()
+
+    def read_port_packet(self):
+        try:
+            packet = self.port.read_packet()
+        except OSError as error:  # Includes serial.SerialException and connection resets
+            raise ConnectionLost(str(error)) from error
+        if len(packet) == 0 and self.port.end_of_stream:
+            raise ConnectionLost('Peer closed the connection')
+        return packet  # Empty for a read timeout with the connection still up
+
+    def connection_lost(self, error):
+        self.log.warning("Lost connection: {}".format(error))
+        self.connections_lost += 1
+        self.set_state(DISCONNECTED)
+        self.close_port()
+        if self.partial_packet_policy == DROP_PARTIAL:
+            self.port.reset_framing()
+
+    def reconnect(self):
+        # One attempt, after the backoff delay. Returns False if it failed or stop() was called during the wait.
+        delay = self.backoff.next_delay()
+        self.log.info("Reconnecting in {:.1f} s.".format(delay))
+        if self.stop_event.wait(delay):
+            return False
+
+        self.set_state(CONNECTING)
+        try:
+            self.port.connect_to_port()
+        except OSError as error:  # ConnectSerial raises when the device isn't there (yet)
+            self.log.warning("Reconnect failed: {}".format(error))
+            self.port.port_readable = False
+        if self.stop_event.is_set():
+            # stop() was called mid connect and has already closed the port, so whatever just opened is left to us
+            if self.port.port_readable:
+                self.close_port()
+            return False
+        if not self.port.port_readable:
+            self.set_state(DISCONNECTED)
+            return False
+
+        self.backoff.reset()
+        self.reconnects += 1
+        self.set_state(CONNECTED)
+        return True
+
+    def set_state(self, state):
+        if state == self.state or self.state == STOPPED:
+            return
+        old_state, self.state = self.state, state
+        self.log.info("Port went from {0} to {1}.".format(old_state, state))
+        for state_callback in self.state_callbacks:
+            state_callback(old_state, state)
+
+    def close_port(self):
+        try:
+            self.port.close()
+        except OSError as error:
+            self.log.warning("Error closing port: {}".format(error))
+
+    def stop(self):
+        # Safe to call from another thread; the reading thread sees empty bytes from read_packet and can finish
+        self.stop_event.set()
+        self.set_state(STOPPED)
+        self.close_port()
+
+    def get_statistics(self):
+        return {'state': self.state, 'connections_lost': self.connections_lost, 'reconnects': self.reconnects}
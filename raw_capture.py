@@ -0,0 +1,178 @@
+"""Record every byte read from a port, before any framing, and play the recordings back"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import struct
+import threading
+import time
+from collections import namedtuple
+from connect_port_get_packet import PacketReader
+from logger import Logger
+import pipeline
+
+# Capture files start with FILE_MAGIC, then hold one record per read:
+#   RECORD_HEADER (timestamp [s since epoch], source id length, data length), source id (utf-8), data
+FILE_MAGIC = b'CSIMRAW1'
+RECORD_HEADER = struct.Struct('<dBI')
+MAX_SOURCE_ID_LENGTH = 255  # [bytes] The most the record header's source id length can hold
+
+RawCaptureRecord = namedtuple('RawCaptureRecord', ['timestamp', 'source_id', 'data'])
+
+
+class RawCaptureWriter:
+    """
+    Appends reads to a capture file from its own thread so the port reader only ever pays for a copy and a queue put.
+    Whatever's waiting is written in one go through a large file buffer. If the disk can't keep up, new reads are
+    dropped (and counted) rather than holding up the reader. If writing fails, e.g., the disk is full, capturing stops
+    and what was written up to then is kept.
+    Input:
+        filename [str]: Capture file; appended to if it already exists
+        buffer_size [int]: [bytes] File buffer, i.e., how much is gathered before each write to disk
+        max_queued_reads [int]: Reads allowed to wait for the writer before new ones are dropped
+    """
+    def __init__(self, filename, buffer_size=1048576, max_queued_reads=10000):
+        self.filename = filename
+        self.log = Logger().create_log()
+        self.queue = pipeline.BoundedQueue(max_queued_reads, pipeline.DROP_NEWEST)
+
+        self.file = open(filename, 'ab', buffering=buffer_size)
+        if self.file.tell() == 0:
+            self.file.write(FILE_MAGIC)
+        self.records_written = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.capturing = True
+
+        self.writer_thread = threading.Thread(target=self.write_records, name='raw capture writer', daemon=True)
+        self.writer_thread.start()
+        self.log.info("Capturing raw data to {}".format(filename))
+
+    def write(self, source_id, data):
+        # Copies data, since ports hand back views into buffers they reuse
+        encoded_source_id = source_id.encode('utf-8')
+        if len(encoded_source_id) > MAX_SOURCE_ID_LENGTH:
+            raise ValueError('Raw capture source id must be at most {0} bytes as UTF-8. Was passed {1!r}'.format(
+                MAX_SOURCE_ID_LENGTH, source_id))
+        if self.capturing:
+            self.queue.put(RawCaptureRecord(time.time(), encoded_source_id, bytes(data)))
+
+    def write_records(self):
+        try:
+            self.write_queued_records()
+        except Exception as error:
+            self.capturing = False
+            self.write_errors += 1
+            self.log.exception("Stopped raw capture to {0} after a write failed: {1}".format(self.filename, error))
+        finally:
+            self.close_file()
+
+    def write_queued_records(self):
+        while True:
+            try:
+                records = [self.queue.get()]
+            except pipeline.QueueClosed:
+                return
+            while self.queue.depth() > 0:
+                records.append(self.queue.get())
+
+            for record in records:
+                self.file.write(RECORD_HEADER.pack(record.timestamp, len(record.source_id), len(record.data)))
+                self.file.write(record.source_id)
+                self.file.write(record.data)
+                self.bytes_written += len(record.data)
+                self.records_written += 1
+
+    def close_file(self):
+        # Flushing what's buffered can fail too, e.g., on a full disk
+        try:
+            self.file.close()
+        except OSError as error:
+            self.write_errors += 1
+            self.log.error("Couldn't finish writing raw capture {0}: {1}".format(self.filename, error))
+
+    def get_statistics(self):
+        return {'records_written': self.records_written, 'bytes_written': self.bytes_written,
+                'records_dropped': self.queue.items_dropped, 'write_errors': self.write_errors}
+
+    def close(self):
+        # Everything already queued is still written
+        self.queue.close()
+        self.writer_thread.join()
+        self.log.info("Closed raw capture {0}: {1}".format(self.filename, self.get_statistics()))
+
+
+def read_raw_capture(filename):
+    """
+    Iterate the records in a capture file. A record cut short (e.g., by a crash mid write) ends the iteration.
+    """
+    with open(filename, 'rb') as capture_file:
+        if capture_file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError('{} is not a raw capture file.'.format(filename))
+        while True:
+            header = capture_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, source_id_length, data_length = RECORD_HEADER.unpack(header)
+            source_id = capture_file.read(source_id_length)
+            data = capture_file.read(data_length)
+            if len(data) < data_length:
+                return
+            yield RawCaptureRecord(timestamp, source_id.decode('utf-8'), data)
+
+
+class ReplayRawCapture(PacketReader):
+    """
+    Feeds a capture file's reads back through the normal framer, e.g., to try out framing fixes on the data that
+    broke the old framing. Turn on KISS decoding etc. just as for the port it was captured from.
+    Input:
+        filename [str]: Capture file
+        source_id [str]: Only replay reads from this source; None for all of them, which is only right if there was
+                         only ever one
+        speed [float]: None to go as fast as possible; otherwise N times the captured pace (1 = real time)
+    """
+    def __init__(self, filename, source_id=None, speed=None):
+        super(ReplayRawCapture, self).__init__()
+
+        self.filename = filename
+        self.source_id = source_id
+        self.speed = speed
+        self.log = Logger().create_log()
+
+        self.records = None
+        self.first_record_timestamp = None
+        self.replay_start_time = None
+        self.port_readable = None
+
+    def connect_to_port(self):
+        self.log.info("Replaying raw capture {}".format(self.filename))
+        self.records = read_raw_capture(self.filename)
+        self.port_readable = True
+        return self
+
+    def get_data_from_buffer(self):
+        for record in self.records:
+            if self.source_id is not None and record.source_id != self.source_id:
+                continue
+            if self.speed:
+                self.wait_for_record_time(record.timestamp)
+            return record.data
+        self.end_of_stream = True
+        return bytes()
+
+    def wait_for_record_time(self, timestamp):
+        now = time.monotonic()
+        if self.first_record_timestamp is None:
+            self.first_record_timestamp = timestamp
+            self.replay_start_time = now
+        record_time = self.replay_start_time + (timestamp - self.first_record_timestamp) / self.speed
+        if record_time > now:
+            time.sleep(record_time - now)
+
+    def packets(self):
+        # Iterate every packet left in the capture
+        return iter(self.read_packet, bytes())
+
+    def close(self):
+        self.log.info("Closing replay of {}.".format(self.filename))
+        if self.records is not None:
+            self.records.close()
@@ -0,0 +1,102 @@
+"""Play recorded .dat files back through the packet framer as if they were coming in from a port"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import glob
+import mmap
+import os
+import time
+from connect_port_get_packet import PacketReader
+from logger import Logger
+
+
+class ReplayDatFile(PacketReader):
+    """
+    Reads the .dat files written by the GUI (save_data_to_disk) through memory maps, so archives of any size are
+    paged in by the OS a chunk at a time instead of being loaded into memory.
+    Input:
+        path [str]: A .dat file or a folder of them (played in filename order, i.e., time order)
+        speed [float]: None to go as fast as possible; otherwise N times the real beacon cadence (1 = real time)
+        beacon_period [float]: [s] Time between beacons in real time
+        chunk_size [int]: [bytes] How much of the file to hand the framer per read
+    """
+    def __init__(self, path, speed=None, beacon_period=16.0, chunk_size=65536):
+        super(ReplayDatFile, self).__init__()
+
+        self.path = path
+        self.speed = speed
+        self.beacon_period = beacon_period
+        self.chunk_size = chunk_size
+        self.log = Logger().create_log()
+
+        self.filenames = []
+        self.file = None
+        self.file_map = None
+        self.read_index = 0
+        self.next_packet_time = None
+        self.port_readable = None
+
+    def connect_to_port(self):
+        if os.path.isdir(self.path):
+            self.filenames = sorted(glob.glob(os.path.join(self.path, '*.dat')))
+        else:
+            self.filenames = [self.path]
+        self.log.info("Replaying {0} .dat file(s) from {1}".format(len(self.filenames), self.path))
+
+        self.port_readable = self.open_next_file()
+        return self
+
+    def open_next_file(self):
+        self.close_file()
+        while self.filenames:
+            filename = self.filenames.pop(0)
+            if os.path.getsize(filename) == 0:
+                continue  # Can't map an empty file, and there'd be nothing to read anyway
+            self.file = open(filename, 'rb')
+            self.file_map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.read_index = 0
+            self.log.info("Replaying {}".format(filename))
+            return True
+        return False
+
+    def get_data_from_buffer(self):
+        # Slicing the memory map copies the chunk out. Views into it would stop the map from closing while the framer
+        # or raw capture still holds one, e.g., a packet cut off at the end of a file.
+        while self.file_map is not None:
+            if self.read_index < len(self.file_map):
+                stop_index = self.read_index + self.chunk_size
+                buffered_data = self.file_map[self.read_index:stop_index]
+                self.read_index = stop_index
+                return buffered_data
+            self.open_next_file()
+        return bytes()  # Out of files
+
+    def read_packet(self):
+        packet = super(ReplayDatFile, self).read_packet()
+        if len(packet) > 0 and self.speed:
+            self.wait_for_packet_time()
+        return packet
+
+    def wait_for_packet_time(self):
+        now = time.monotonic()
+        if self.next_packet_time is None:
+            self.next_packet_time = now
+        elif self.next_packet_time > now:
+            time.sleep(self.next_packet_time - now)
+        self.next_packet_time += self.beacon_period / self.speed
+
+    def packets(self):
+        # Iterate every packet left in the archive
+        return iter(self.read_packet, bytes())
+
+    def close_file(self):
+        if self.file_map is not None:
+            self.file_map.close()
+            self.file.close()
+        self.file_map = None
+        self.file = None
+
+    def close(self):
+        self.log.info("Closing replay of {}.".format(self.path))
+        self.close_file()
+        self.filenames = []
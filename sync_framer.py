@@ -0,0 +1,217 @@
+"""Cut spacecraft packets out of a byte stream as the bytes arrive"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import re
+import struct
+import ccsds
+from find_sync_bytes import FindSyncBytes
+
+
+class SyncFramer:
+    """
+    Keeps whatever has arrived since the last complete packet and only ever searches bytes it hasn't ruled out yet.
+    Garbage in front of a sync pattern is dropped as soon as it's seen, so the buffer never holds more than one
+    packet's worth of data plus the newest read.
+
+    The sync pattern is the start of a CCSDS primary header, and the packet is cut using that header's length field.
+    A packet sent as several segments (e.g., the CSIM beacon, split across two AX.25 frames) is followed from its
+    first segment through its last, keeping whatever link layer bytes sit between segments so field offsets match
+    the documented beacon layout.
+
+    If bytes are lost, the packet being collected runs into the next one. Any packet start turning up before the
+    expected end means exactly that, so the short packet is thrown away and framing picks up at the new start. The
+    search for it resumes where the last one stopped, so each byte is looked at once however slowly it trickles in.
+    Input:
+        sync_patterns [list]: Header starts to sync on; defaults to every packet type in FindSyncBytes
+        max_packet_length [int]: [bytes] A header claiming more than this is taken to be a false sync
+        max_segment_gap [int]: [bytes] How far past the end of one segment to look for the next before giving up
+    """
+    def __init__(self, sync_patterns=None, max_packet_length=1024, max_segment_gap=64):
+        if sync_patterns is None:
+            fsb = FindSyncBytes()
+            sync_patterns = [fsb.start_sync_bytes, fsb.log_sync_bytes]
+        self.sync_patterns = [bytes(sync_bytes) for sync_bytes in sync_patterns]
+        self.sync_length = max(len(sync_bytes) for sync_bytes in self.sync_patterns)
+        # One pass over the buffer for every pattern at once that stops at the first hit. Searching for each pattern
+        # separately would scan to the end of the buffer for any that isn't there, after every packet.
+        self.sync_search = re.compile(b'|'.join(re.escape(sync_bytes) for sync_bytes in self.sync_patterns)).search
+        self.max_packet_length = max_packet_length
+        self.max_segment_gap = max_segment_gap
+
+        self.buffer = bytearray()
+        self.in_packet = False  # True once buffer[0] is the start of a packet
+        self.packet_stop_index = None  # End of the last segment found so far
+        self.next_segment_patterns = None  # Header bytes the next segment will start with, if more are coming
+        self.resync_scan_index = None  # Where to pick up looking for a packet start inside the current packet
+
+        self.incomplete_packets = 0  # Segmented packets whose later segments never showed up
+        self.resync_events = 0  # Packets cut short by the start of the next one, i.e., bytes were lost
+        self.false_syncs = 0  # Sync patterns followed by a header that made no sense
+
+    def feed(self, data):
+        """
+        Add newly received bytes and return an iterator over the packets they complete
+        """
+        self.buffer += data
+        return iter(self.next_packet, None)
+
+    def next_packet(self):
+        """
+        Returns the next complete packet as bytes, or None if more data is needed
+        """
+        while True:
+            if not self.in_packet and not self.find_packet_start():
+                return None
+            if self.packet_stop_index is None and not self.read_first_header():
+                if self.in_packet:
+                    return None  # Header isn't all here yet
+                continue  # Header was nonsense so that wasn't a real sync; look for the next one
+
+            while self.next_segment_patterns is not None and self.find_next_segment():
+                pass
+            if not self.in_packet:
+                continue  # Gave up waiting for the rest of that packet
+            if self.find_resync():
+                continue
+
+            if self.next_segment_patterns is not None or len(self.buffer) < self.packet_stop_index:
+                return None
+            return self.cut_packet()
+
+    def find_sync(self, start_index=0, stop_index=None):
+        if stop_index is None:
+            stop_index = len(self.buffer)
+        match = self.sync_search(self.buffer, start_index, stop_index)
+        return match.start() if match else -1
+
+    def find_packet_start(self):
+        start_index = self.find_sync()
+        if start_index == -1:
+            # Hang on to the tail in case the sync pattern is split across reads
+            del self.buffer[:max(len(self.buffer) - self.sync_length + 1, 0)]
+            return False
+
+        del self.buffer[:start_index]
+        self.in_packet = True
+        return True
+
+    def read_first_header(self):
+        if len(self.buffer) < ccsds.PRIMARY_HEADER_LENGTH:
+            return False
+
+        header = ccsds.parse_primary_header(self.buffer)
+        packet_length = ccsds.get_packet_length(header)
+        if packet_length > self.max_packet_length:
+            self.skip_false_sync()
+            return False
+
+        self.packet_stop_index = packet_length
+        self.resync_scan_index = 1
+        if header.sequence_flags == ccsds.FIRST_SEGMENT:
+            self.expect_next_segment(header)
+        return True
+
+    def expect_next_segment(self, header):
+        # Later segments carry the same APID and the next sequence count but never a secondary header
+        packet_id = (header.version << 13) | (header.packet_type << 12) | header.apid
+        sequence_count = (header.sequence_count + 1) & ccsds.SEQUENCE_COUNT_MASK
+        self.next_segment_patterns = [struct.pack('>HH', packet_id, (sequence_flags << 14) | sequence_count)
+                                      for sequence_flags in (ccsds.CONTINUATION_SEGMENT, ccsds.LAST_SEGMENT)]
+
+    def find_next_segment(self):
+        search_start_index = self.packet_stop_index
+        search_stop_index = search_start_index + self.max_segment_gap + ccsds.PRIMARY_HEADER_LENGTH
+        segment_indices = [self.buffer.find(pattern, search_start_index, search_stop_index)
+                           for pattern in self.next_segment_patterns]
+        segment_indices = [index for index in segment_indices if index != -1]
+
+        if not segment_indices:
+            if len(self.buffer) >= search_stop_index:
+                self.give_up_on_packet()
+            return False
+
+        segment_index = min(segment_indices)
+        if len(self.buffer) < segment_index + ccsds.PRIMARY_HEADER_LENGTH:
+            return False
+
+        header = ccsds.parse_primary_header(self.buffer, segment_index)
+        packet_stop_index = segment_index + ccsds.get_packet_length(header)
+        if packet_stop_index > self.max_packet_length:
+            self.give_up_on_packet()
+            return False
+
+        self.packet_stop_index = packet_stop_index
+        if header.sequence_flags == ccsds.LAST_SEGMENT:
+            self.next_segment_patterns = None
+        else:
+            self.expect_next_segment(header)
+        return True
+
+    def find_resync(self):
+        """
+        Looks for the start of a new packet before the current one should end, including the gap where its next
+        segment should be. If one is found, the current packet is dropped and framing restarts there.
+        """
+        scan_stop_index = self.packet_stop_index
+        if self.next_segment_patterns is not None:
+            scan_stop_index += self.max_segment_gap + ccsds.PRIMARY_HEADER_LENGTH
+        # A sync pattern that starts on the packet's last byte still means the packet is short
+        scan_stop_index = min(scan_stop_index + self.sync_length - 1, len(self.buffer))
+
+        while True:
+            start_index = self.find_sync(self.resync_scan_index, scan_stop_index)
+            if start_index == -1:
+                # Back off by less than a sync pattern in case one is split across the stop
+                self.resync_scan_index = max(scan_stop_index - self.sync_length + 1, self.resync_scan_index)
+                return False
+            if len(self.buffer) < start_index + ccsds.PRIMARY_HEADER_LENGTH:
+                self.resync_scan_index = start_index  # Can't tell if it's real until its header is all here
+                return False
+            if self.is_packet_start(start_index):
+                break
+            self.resync_scan_index = start_index + 1  # Just the sync pattern turning up in the data
+
+        self.resync_events += 1
+        del self.buffer[:start_index]
+        self.end_packet()
+        self.in_packet = True
+        return True
+
+    def is_packet_start(self, index):
+        # A new packet starts with its first (or only) segment and a length we'd accept
+        header = ccsds.parse_primary_header(self.buffer, index)
+        return (header.sequence_flags in (ccsds.FIRST_SEGMENT, ccsds.UNSEGMENTED) and
+                ccsds.get_packet_length(header) <= self.max_packet_length)
+
+    def cut_packet(self):
+        with memoryview(self.buffer) as view:
+            packet = bytes(view[:self.packet_stop_index])
+        del self.buffer[:self.packet_stop_index]  # Cheap: bytearray drops bytes off the front without moving the rest
+        self.end_packet()
+        return packet
+
+    def give_up_on_packet(self):
+        # The rest of the packet never came. Everything up to the end of the last good segment goes.
+        self.incomplete_packets += 1
+        del self.buffer[:self.packet_stop_index]
+        self.end_packet()
+
+    def skip_false_sync(self):
+        self.false_syncs += 1
+        del self.buffer[:1]
+        self.end_packet()
+
+    def end_packet(self):
+        self.in_packet = False
+        self.packet_stop_index = None
+        self.next_segment_patterns = None
+        self.resync_scan_index = None
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.end_packet()
+
+    def get_statistics(self):
+        return {'incomplete_packets': self.incomplete_packets, 'resync_events': self.resync_events,
+                'false_syncs': self.false_syncs}
@@ -0,0 +1,457 @@
+"""Load telemetry definitions (CSV or JSON) and compile them into fast packet decoders"""
+__author__ = "Matthew Hanley"
+__contact__ = "mattdhanley@gmail.com"
+
+import csv
+import hashlib
+import json
+import os
+import struct
+from collections import namedtuple
+from collections.abc import Mapping
+import numpy as np
+from logger import Logger
+
+TelemetryPoint = namedtuple('TelemetryPoint', ['name', 'offset', 'type', 'endianness', 'scale', 'units',
+                                               'limit_low', 'limit_high', 'bits', 'bias'])
+
+TYPE_CODES = {'int8': 'b', 'uint8': 'B', 'int16': 'h', 'uint16': 'H', 'int32': 'i', 'uint32': 'I', 'int64': 'q',
+              'uint64': 'Q', 'float32': 'f', 'float64': 'd'}
+BYTE_ORDER_CODES = {'big': '>', 'little': '<'}
+NUMPY_TYPES = {'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2', 'int32': 'i4', 'uint32': 'u4', 'int64': 'i8',
+               'uint64': 'u8', 'float32': 'f4', 'float64': 'f8'}
+
+COMPILED_FORMAT_VERSION = 4  # Bump when the compiled form changes so old cache files are ignored
+
+
+def get_default_cache_folder():
+    return os.path.join(os.path.expanduser("~"), "CSIM_Beacon_Decoder", "cache")
+
+
+def load_definition(filename):
+    """
+    Read telemetry points from a .csv (lines starting with # are comments) or a .json list of objects. Both use the
+    TelemetryPoint field names; units, limits, bits and bias may be left out or blank.
+    value = raw value * scale + bias, with bias 0 unless given, e.g., for sensors read out in offset counts.
+    bits picks out a flag packed in an integer, e.g., "0" for the lowest bit or "4-7" for the high nibble of a byte.
+    Points packed in the same integer all give its offset and type.
+    """
+    with open(filename, newline='') as definition_file:
+        if filename.endswith('.json'):
+            rows = json.load(definition_file)
+        else:
+            rows = list(csv.DictReader(line for line in definition_file if not line.startswith('#')))
+    return [make_point(row, filename) for row in rows]
+
+
+def make_point(row, filename):
+    try:
+        point = TelemetryPoint(name=row['name'], offset=int(row['offset']), type=row['type'],
+                               endianness=row.get('endianness') or 'big', scale=float(row.get('scale') or 1.0),
+                               units=row.get('units') or '', limit_low=parse_limit(row.get('limit_low')),
+                               limit_high=parse_limit(row.get('limit_high')),
+                               bits=None if row.get('bits') in (None, '') else str(row['bits']),
+                               bias=float(row.get('bias') or 0.0))
+        parse_bits(point.bits)
+    except (KeyError, ValueError) as error:
+        raise ValueError('Bad telemetry point {0} in {1}: {2}'.format(row, filename, error))
+    if point.type not in TYPE_CODES:
+        raise ValueError('Telemetry point {0} has unknown type {1}. Must be one of {2}.'.format(
+            point.name, point.type, sorted(TYPE_CODES)))
+    if point.endianness not in BYTE_ORDER_CODES:
+        raise ValueError('Telemetry point {0} has unknown endianness {1}. Must be big or little.'.format(
+            point.name, point.endianness))
+    if point.bits is not None and point.type.startswith('float'):
+        raise ValueError('Telemetry point {0} takes bits from a {1}. Bits must come from an integer type.'.format(
+            point.name, point.type))
+    return point
+
+
+def parse_limit(limit):
+    if limit is None or limit == '':
+        return None
+    return float(limit)
+
+
+def parse_bits(bits):
+    # "3" -> (shift 3, width 1); "4-7" -> (shift 4, width 4). Bit 0 is the least significant.
+    if bits is None:
+        return None
+    first_bit, _, last_bit = str(bits).partition('-')
+    first_bit = int(first_bit)
+    last_bit = int(last_bit) if last_bit else first_bit
+    if first_bit < 0 or last_bit < first_bit:
+        raise ValueError('Bits must be "n" or "first-last" counting up from bit 0, was {}'.format(bits))
+    return first_bit, last_bit - first_bit + 1
+
+
+def compile_definition(points):
+    """
+    Returns the compiled form as plain data (so it can be cached as JSON): one struct format per byte order in use,
+    each skipping every byte that isn't one of its fields, with the names and scales of the values it unpacks.
+    Integers holding bit flags get a struct of their own per byte order, each unpacked once however many flags it
+    holds, with the name, shift, mask and scale of every flag.
+    Points are checked for overlap here so a bad definition fails at load time rather than while decoding.
+    """
+    points = sorted(points, key=lambda point: point.offset)
+    whole_points = [point for point in points if point.bits is None]
+    bit_points = [point for point in points if point.bits is not None]
+
+    # Flags in the same integer share it, as can a point reading the whole integer, so the overlap check sees each
+    # integer once
+    containers = []
+    for point in bit_points:
+        container = (point.offset, point.type, point.endianness)
+        if container not in containers:
+            containers.append(container)
+        shift, width = parse_bits(point.bits)
+        if shift + width > 8 * struct.calcsize(TYPE_CODES[point.type]):
+            raise ValueError('Telemetry point {0} bits {1} run past the end of its {2}.'.format(point.name, point.bits,
+                                                                                               point.type))
+    whole_fields = {(point.offset, point.type, point.endianness) for point in whole_points}
+    spans = sorted([(point.offset, point.type, point.name) for point in whole_points] +
+                   [(offset, point_type, 'bits at {}'.format(offset)) for offset, point_type, endianness in containers
+                    if (offset, point_type, endianness) not in whole_fields])
+    stop_index = 0
+    for offset, point_type, name in spans:
+        if offset < stop_index:
+            raise ValueError('Telemetry point {0} at offset {1} overlaps the point before it.'.format(name, offset))
+        stop_index = offset + struct.calcsize(TYPE_CODES[point_type])
+
+    layouts = []
+    bit_layouts = []
+    for endianness in BYTE_ORDER_CODES:
+        layout_points = [point for point in whole_points if point.endianness == endianness]
+        if layout_points:
+            layouts.append({'format': make_struct_format(endianness, [(point.offset, point.type)
+                                                                      for point in layout_points]),
+                            'names': [point.name for point in layout_points],
+                            'scales': [point.scale for point in layout_points]})
+
+        layout_containers = [container for container in containers if container[2] == endianness]
+        if layout_containers:
+            bitfields = []
+            for point in bit_points:
+                if point.endianness != endianness:
+                    continue
+                shift, width = parse_bits(point.bits)
+                bitfields.append([point.name, layout_containers.index((point.offset, point.type, endianness)),
+                                  shift, (1 << width) - 1, point.scale])
+            bit_layouts.append({'format': make_struct_format(endianness, [(offset, point_type) for offset, point_type, _
+                                                                          in layout_containers]),
+                                'bitfields': bitfields})
+
+    return {'version': COMPILED_FORMAT_VERSION, 'layouts': layouts, 'bit_layouts': bit_layouts,
+            'packet_length': stop_index,
+            'points': [[point.name, point.offset, point.type, point.endianness, point.scale] for point in points],
+            'bitfields': {point.name: list(parse_bits(point.bits)) for point in bit_points},
+            'biases': {point.name: point.bias for point in points if point.bias != 0},
+            'units': {point.name: point.units for point in points},
+            'limits': {point.name: [point.limit_low, point.limit_high] for point in points
+                       if point.limit_low is not None or point.limit_high is not None}}
+
+
+def make_struct_format(endianness, fields):
+    # fields: (offset, type) in offset order; the bytes between them are skipped with pad bytes
+    struct_format = BYTE_ORDER_CODES[endianness]
+    stop_index = 0
+    for offset, point_type in fields:
+        if offset > stop_index:
+            struct_format += '{}x'.format(offset - stop_index)
+        struct_format += TYPE_CODES[point_type]
+        stop_index = offset + struct.calcsize(TYPE_CODES[point_type])
+    return struct_format
+
+
+class CompiledDecoder:
+    """
+    Decodes every point in a compiled telemetry definition with one struct.unpack_from per byte order in use
+    (usually just one), plus one for any integers holding bit flags, or whole archives at once through a NumPy
+    structured dtype with decode_batch. Either can be given the names of the fields wanted, in which case only
+    those fields' bytes are read (see project).
+    Build with load_decoder rather than directly.
+    """
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.layouts = [(struct.Struct(layout['format']), tuple(layout['names']), tuple(layout['scales']))
+                        for layout in compiled['layouts']]
+        self.bit_layouts = [(struct.Struct(layout['format']),
+                             tuple(tuple(bitfield) for bitfield in layout['bitfields']))
+                            for layout in compiled['bit_layouts']]
+        self.packet_length = compiled['packet_length']  # [bytes] From the start of the packet to the last point
+        self.units = compiled['units']
+        self.limits = {name: tuple(limits) for name, limits in compiled['limits'].items()}
+        self.scales = {name: scale for name, _, _, _, scale in compiled['points']}
+        self.bitfields = {name: tuple(shift_and_width) for name, shift_and_width in compiled['bitfields'].items()}
+        self.biases = compiled['biases']  # Only the points that have one
+        # One small struct per point, for TelemetryRecord to decode just the points that are asked for: its
+        # unpack_from, offset, scale, bias and (shift, mask) if it's a bit flag
+        self.point_decoders = {}
+        for name, offset, point_type, endianness, scale in compiled['points']:
+            bits = None
+            if name in self.bitfields:
+                shift, width = self.bitfields[name]
+                bits = (shift, (1 << width) - 1)
+            point_struct = struct.Struct(BYTE_ORDER_CODES[endianness] + TYPE_CODES[point_type])
+            self.point_decoders[name] = (point_struct.unpack_from, offset, scale, self.biases.get(name, 0.0), bits)
+        # Flags in the same integer are fields at the same offset, each viewing the whole integer
+        self.dtype = np.dtype({'names': [name for name, _, _, _, _ in compiled['points']],
+                               'formats': [BYTE_ORDER_CODES[endianness] + NUMPY_TYPES[point_type]
+                                           for _, _, point_type, endianness, _ in compiled['points']],
+                               'offsets': [offset for _, offset, _, _, _ in compiled['points']],
+                               'itemsize': self.packet_length})
+        # Just the bytes some point reads, for gathering packets at irregular offsets without copying the rest
+        point_bytes = [np.arange(offset, offset + struct.calcsize(TYPE_CODES[point_type]), dtype=np.intp)
+                       for _, offset, point_type, _, _ in compiled['points']]
+        self.gather_indices = np.unique(np.concatenate(point_bytes)) if point_bytes else np.zeros(0, dtype=np.intp)
+        self.gather_dtype = np.dtype({'names': list(self.dtype.names),
+                                      'formats': [self.dtype.fields[name][0] for name in self.dtype.names],
+                                      'offsets': [int(np.searchsorted(self.gather_indices, self.dtype.fields[name][1]))
+                                                  for name in self.dtype.names],
+                                      'itemsize': len(self.gather_indices)})
+        self.projections = {}
+
+    def decode(self, buffer, offset=0, fields=None):
+        """
+        Returns {name: raw value * scale + bias} for every point, or just those named in fields, reading the packet that
+        starts at buffer[offset]
+        """
+        if fields is not None:
+            return self.project(fields).decode(buffer, offset)
+        telemetry = {}
+        for layout_struct, names, scales in self.layouts:
+            raw_values = layout_struct.unpack_from(buffer, offset)
+            telemetry.update({name: raw_value * scale for name, raw_value, scale in zip(names, raw_values, scales)})
+        for bits_struct, bitfields in self.bit_layouts:
+            containers = bits_struct.unpack_from(buffer, offset)
+            for name, index, shift, mask, scale in bitfields:
+                telemetry[name] = (containers[index] >> shift & mask) * scale
+        for name, bias in self.biases.items():
+            telemetry[name] += bias
+        return telemetry
+
+    def project(self, fields):
+        """
+        Returns a decoder for just the named fields, compiled the first time those fields are asked for. Its layouts
+        skip every other byte, so decoding with it costs about what the fields it reads do. Packets are still
+        expected to be as long as for the full definition.
+        """
+        fields = tuple(fields)
+        projection = self.projections.get(fields)
+        if projection is not None:
+            return projection
+
+        unknown_fields = [name for name in fields if name not in self.scales]
+        if unknown_fields:
+            raise KeyError('No telemetry points named {}'.format(unknown_fields))
+        points = []
+        for name, offset, point_type, endianness, scale in self.compiled['points']:
+            if name not in fields:
+                continue
+            bits = None
+            if name in self.bitfields:
+                shift, width = self.bitfields[name]
+                bits = '{0}-{1}'.format(shift, shift + width - 1)
+            limit_low, limit_high = self.limits.get(name, (None, None))
+            points.append(TelemetryPoint(name, offset, point_type, endianness, scale, self.units[name], limit_low,
+                                         limit_high, bits, self.biases.get(name, 0.0)))
+        compiled = compile_definition(points)
+        compiled['packet_length'] = self.packet_length  # So the same packets count as whole as with every point
+        projection = self.projections[fields] = CompiledDecoder(compiled)
+        return projection
+
+    def decode_point(self, buffer, name, offset=0):
+        # Just the one point, e.g., for a TelemetryRecord. Raises KeyError for a name that isn't in the definition.
+        unpack_from, point_offset, scale, bias, bits = self.point_decoders[name]
+        raw_value = unpack_from(buffer, offset + point_offset)[0]
+        if bits is not None:
+            raw_value = raw_value >> bits[0] & bits[1]
+        return raw_value * scale + bias
+
+    def record(self, buffer, offset=0):
+        """
+        Returns a TelemetryRecord that decodes points from the packet at buffer[offset] as they're read
+        """
+        return TelemetryRecord(self, buffer, offset)
+
+    def decode_batch(self, buffer, offsets=None, stride=None, first_offset=0, fields=None):
+        """
+        Decodes many packets in one vectorized pass and returns {name: numpy float64 array of raw value * scale + bias}.
+        Input:
+            buffer [bytes-like]: Holds the packets, e.g., an mmapped .dat file. Not copied when using stride.
+            offsets [array]: Where each packet starts, for packets at irregular spacing (see find_packet_offsets)
+            stride [int]: [bytes] Or, the spacing of packets laid end to end starting at first_offset
+            fields [list]: Names of the points wanted; None for all of them. Only their bytes are read.
+        """
+        if fields is not None:
+            return self.project(fields).decode_batch(buffer, offsets, stride, first_offset)
+        raw_packets = self.view_packets(buffer, offsets, stride, first_offset)
+        telemetry = {}
+        for name, scale in self.scales.items():
+            raw_values = raw_packets[name]
+            if name in self.bitfields:
+                shift, width = self.bitfields[name]
+                raw_values = raw_values >> shift & (1 << width) - 1
+            telemetry[name] = raw_values.astype(np.float64) * scale + self.biases.get(name, 0.0)
+        return telemetry
+
+    def view_packets(self, buffer, offsets=None, stride=None, first_offset=0):
+        # Structured array with one record per packet, raw (unscaled) values in each field. Bit flags come out as
+        # their whole integer.
+        buffer_bytes = np.frombuffer(buffer, dtype=np.uint8)
+        if offsets is not None:
+            offsets = np.asarray(offsets, dtype=np.intp)
+            # Fancy indexing gathers the bytes the points read from every packet into one contiguous block the
+            # gather dtype can lay over
+            packet_bytes = buffer_bytes[offsets[:, np.newaxis] + self.gather_indices]
+            return packet_bytes.reshape(-1).view(self.gather_dtype)
+
+        if stride is None:
+            stride = self.packet_length
+        number_of_packets = max((len(buffer_bytes) - first_offset - self.packet_length) // stride + 1, 0)
+        return np.ndarray((number_of_packets,), dtype=self.dtype, buffer=buffer_bytes, offset=first_offset,
+                          strides=(stride,))
+
+    def out_of_limits(self, telemetry):
+        """
+        Returns the names of points outside their limits
+        """
+        out_of_limits = []
+        for name, (limit_low, limit_high) in self.limits.items():
+            value = telemetry.get(name)
+            if value is None:
+                continue
+            if (limit_low is not None and value < limit_low) or (limit_high is not None and value > limit_high):
+                out_of_limits.append(name)
+        return out_of_limits
+
+
+class TelemetryRecord(Mapping):
+    """
+    Read only {name: value} view of one packet that decodes a point the first time it's read and keeps the value.
+    Works like the dict from CompiledDecoder.decode (record['bct_box1_temp'], .get, .items, ...), and points can be
+    read as attributes too (record.bct_box1_temp). materialize() decodes everything left in one go.
+    The buffer isn't copied, so it mustn't change while the record is in use; materialize() first if it will.
+    """
+    # Underscores keep the slots from hiding points of the same name from attribute access
+    __slots__ = ('_decoder', '_point_decoders', '_buffer', '_offset', '_values')
+
+    def __init__(self, decoder, buffer, offset=0):
+        self._decoder = decoder
+        self._point_decoders = decoder.point_decoders
+        self._buffer = buffer
+        self._offset = offset
+        self._values = {}
+
+    def __getitem__(self, name):
+        # CompiledDecoder.decode_point written out, since this is what every read of a new point costs
+        values = self._values
+        if name in values:
+            return values[name]
+        unpack_from, point_offset, scale, bias, bits = self._point_decoders[name]
+        raw_value = unpack_from(self._buffer, self._offset + point_offset)[0]
+        if bits is not None:
+            raw_value = raw_value >> bits[0] & bits[1]
+        value = values[name] = raw_value * scale + bias
+        return value
+
+    def __getattr__(self, name):
+        # Only called for names that aren't slots or methods
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError("TelemetryRecord has no point {}".format(name)) from None
+
+    def __contains__(self, name):
+        return name in self._point_decoders
+
+    def __iter__(self):
+        return iter(self._point_decoders)
+
+    def __len__(self):
+        return len(self._point_decoders)
+
+    def materialize(self):
+        """
+        Returns every point as a plain dict, decoding whatever hasn't been read yet with one full decode
+        """
+        if len(self._values) < len(self):
+            # Values already read stay as they were, even if the buffer has changed since
+            values = self._decoder.decode(self._buffer, self._offset)
+            values.update(self._values)
+            self._values = values
+        return dict(self._values)
+
+    def __repr__(self):
+        return 'TelemetryRecord({0} of {1} points decoded)'.format(len(self._values), len(self))
+
+
+def find_packet_offsets(buffer, sync_bytes, packet_length):
+    """
+    Start of every packet in a buffer of packets with anything (or nothing) between them, e.g., a .dat archive.
+    Sync patterns are found in one vectorized pass; any that fall inside the packet before them are data, not syncs.
+    Packets cut off by the end of the buffer are left out.
+    """
+    buffer_bytes = np.frombuffer(buffer, dtype=np.uint8)
+    last_start_index = len(buffer_bytes) - packet_length
+    if last_start_index < 0:
+        return np.zeros(0, dtype=np.intp)
+
+    matches = buffer_bytes[:last_start_index + 1] == sync_bytes[0]
+    for i in range(1, len(sync_bytes)):
+        matches &= buffer_bytes[i:last_start_index + 1 + i] == sync_bytes[i]
+    candidates = np.flatnonzero(matches)
+
+    offsets = []
+    next_allowed_index = 0
+    for candidate in candidates.tolist():
+        if candidate >= next_allowed_index:
+            offsets.append(candidate)
+            next_allowed_index = candidate + packet_length
+    return np.array(offsets, dtype=np.intp)
+
+
+def load_decoder(filename, cache_folder=None):
+    """
+    Compile a telemetry definition, or pick up the compiled form cached from the last time this exact file (by its
+    SHA-256) was loaded. Pass cache_folder=False to skip the cache.
+    """
+    if cache_folder is None:
+        cache_folder = get_default_cache_folder()
+    if cache_folder is False:
+        return CompiledDecoder(compile_definition(load_definition(filename)))
+
+    with open(filename, 'rb') as definition_file:
+        definition_hash = hashlib.sha256(definition_file.read()).hexdigest()
+    cache_filename = os.path.join(cache_folder, 'telemetry_{}.json'.format(definition_hash))
+
+    compiled = read_compiled_cache(cache_filename)
+    if compiled is None:
+        compiled = compile_definition(load_definition(filename))
+        write_compiled_cache(cache_filename, compiled)
+    return CompiledDecoder(compiled)
+
+
+def read_compiled_cache(cache_filename):
+    try:
+        with open(cache_filename) as cache_file:
+            compiled = json.load(cache_file)
+    except (OSError, ValueError):
+        return None  # Not cached yet, or cut short by a crash; compile it again
+    if compiled.get('version') != COMPILED_FORMAT_VERSION:
+        return None
+    return compiled
+
+
+def write_compiled_cache(cache_filename, compiled):
+    # Written to a temporary name then moved into place so another process never reads half a file
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        temporary_filename = '{0}.{1}.tmp'.format(cache_filename, os.getpid())
+        with open(temporary_filename, 'w') as cache_file:
+            json.dump(compiled, cache_file)
+        os.replace(temporary_filename, cache_filename)
+    except OSError as error:  # A read only home folder shouldn't stop decoding
+        Logger().create_log().warning("Couldn't cache compiled telemetry definition: {}".format(error))
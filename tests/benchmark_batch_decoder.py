@@ -0,0 +1,50 @@
+# Decodes a day of beacons (one every 16 s) from a .dat archive three ways: CsimParser per packet, parse_packets
+# finding each beacon by its sync bytes, and parse_packets with a fixed stride.
+# Run from the repository root: python tests/benchmark_batch_decoder.py
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csim_parser import CsimParser, parse_dat_file, parse_packets
+from example_data import get_csim_example_packet
+from replay_dat_file import ReplayDatFile
+
+number_of_packets = 86400 // 16
+
+
+def main():
+    packet = bytes(get_csim_example_packet())
+    with tempfile.TemporaryDirectory() as dat_folder:
+        dat_filename = os.path.join(dat_folder, 'one_day.dat')
+        with open(dat_filename, 'wb') as dat_file:
+            dat_file.write(packet * number_of_packets)
+
+        start_time = time.perf_counter()
+        replay = ReplayDatFile(dat_filename).connect_to_port()
+        telemetry = [CsimParser(replayed_packet).parse_packet() for replayed_packet in replay.packets()]
+        replay.close()
+        per_packet_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        batch = parse_dat_file(dat_filename)
+        sync_search_time = time.perf_counter() - start_time
+
+        with open(dat_filename, 'rb') as dat_file:
+            archive = dat_file.read()
+        start_time = time.perf_counter()
+        parse_packets(archive, stride=len(packet))
+        stride_time = time.perf_counter() - start_time
+
+    assert len(telemetry) == len(batch['bct_tai_seconds']) == number_of_packets
+    print('{} beacons'.format(number_of_packets))
+    print('framer + CsimParser per packet: {:8.1f} ms'.format(per_packet_time * 1e3))
+    print('parse_dat_file (sync search):   {:8.1f} ms'.format(sync_search_time * 1e3))
+    print('parse_packets (fixed stride):   {:8.1f} ms'.format(stride_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
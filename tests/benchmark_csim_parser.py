@@ -0,0 +1,60 @@
+# Compares CsimDecoder.decode (everything set up once) and CsimParser.parse_packet (one precompiled struct, but a
+# new parser, logger and sync search per packet) to the old way of calling decode_general on a slice for every field.
+# The gap between the second and third rows is the per-packet setup overhead. The decode_record rows read points from
+# a lazy TelemetryRecord, as the GUI does.
+# Run from the repository root: python tests/benchmark_csim_parser.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csim_parser import CsimDecoder, CsimParser
+from example_data import get_csim_example_data
+from test_csim_parser import beacon_points, decode_field_by_field
+
+number_of_packets = 20000
+# About what the GUI shows
+display_points = [point for point in beacon_points if point.name in [
+    'bct_tai_seconds', 'bct_time_valid', 'bct_adcs_mode', 'bct_Q_BODY_WRT_ECI1', 'bct_Q_BODY_WRT_ECI2',
+    'bct_Q_BODY_WRT_ECI3', 'bct_Q_BODY_WRT_ECI4', 'bct_filtered_speed_rpm1', 'bct_filtered_speed_rpm2',
+    'bct_filtered_speed_rpm3', 'bct_position_error1', 'bct_position_error2', 'bct_position_error3',
+    'bct_mag_vector_body1', 'bct_mag_vector_body2', 'bct_mag_vector_body3', 'bct_battery_current',
+    'bct_battery_voltage', 'bct_bus_voltage', 'bct_box1_temp']]
+
+
+def read_points(record, points=display_points):
+    for point in points:
+        record[point.name]
+
+
+def time_decoder(decoder, packet):
+    start_time = time.perf_counter()
+    for _ in range(number_of_packets):
+        decoder(packet)
+    return time.perf_counter() - start_time
+
+
+def main():
+    packet = bytes(get_csim_example_data())
+    csim_decoder = CsimDecoder()
+    decoders = [('decode_general per field', decode_field_by_field),
+                ('CsimParser(packet).parse_packet()', lambda packet: CsimParser(packet).parse_packet()),
+                ('csim_decoder.decode(packet), shared', csim_decoder.decode),
+                ('decode_record, {} points read'.format(len(display_points[-5:])),
+                 lambda packet: read_points(csim_decoder.decode_record(packet), display_points[-5:])),
+                ('decode_record, {} points read'.format(len(display_points)),
+                 lambda packet: read_points(csim_decoder.decode_record(packet))),
+                ('decode_record(packet).materialize()',
+                 lambda packet: csim_decoder.decode_record(packet).materialize())]
+
+    print('{} points per beacon'.format(len(beacon_points)))
+    for name, decoder in decoders:
+        elapsed_time = time_decoder(decoder, packet)
+        print('{0:<36}: {1:>8,.0f} packets/s, {2:6.1f} us/packet'.format(name, number_of_packets / elapsed_time,
+                                                                        elapsed_time / number_of_packets * 1e6))
+
+
+if __name__ == '__main__':
+    main()
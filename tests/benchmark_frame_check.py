@@ -0,0 +1,34 @@
+# Compares the C backed crc16_x25 to a pure Python table loop on beacon sized AX.25 frames.
+# Run from the repository root: python tests/benchmark_frame_check.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from frame_check import crc16_x25, crc16_x25_bytewise
+from example_data import get_csim_example_ax25_frames
+
+number_of_frames = 20000
+
+
+def time_crc(crc_function, frames):
+    start_time = time.perf_counter()
+    for frame in frames:
+        crc_function(frame)
+    return time.perf_counter() - start_time
+
+
+def main():
+    frames = [memoryview(bytes(frame)) for frame in get_csim_example_ax25_frames()] * (number_of_frames // 2)
+    number_of_bytes = sum(len(frame) for frame in frames)
+
+    for crc_function in [crc16_x25, crc16_x25_bytewise]:
+        elapsed_time = time_crc(crc_function, frames)
+        print('{0}: {1} frames, {2:,.0f} bytes in {3:.3f} s: {4:,.1f} MB/s'.format(
+            crc_function.__name__, len(frames), number_of_bytes, elapsed_time, number_of_bytes / elapsed_time / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# Measures KissDeframer throughput on a stream of escaped beacons read in socket-sized chunks.
+# Run from the repository root: python tests/benchmark_kiss_deframer.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kiss import KissDeframer, encode_kiss_frame
+from example_data import get_csim_example_data
+
+number_of_frames = 20000
+chunk_size = 4096
+
+
+def main():
+    stream = encode_kiss_frame(get_csim_example_data()) * number_of_frames
+    deframer = KissDeframer()
+
+    start_time = time.perf_counter()
+    frames_decoded = 0
+    for i in range(0, len(stream), chunk_size):
+        frames_decoded += len(deframer.feed(stream[i:i + chunk_size]))
+    elapsed_time = time.perf_counter() - start_time
+
+    print('{0} frames, {1:,.0f} bytes in {2:.3f} s: {3:,.1f} MB/s'.format(frames_decoded, len(stream), elapsed_time,
+                                                                       len(stream) / elapsed_time / 1e6))
+
+
+if __name__ == '__main__':
+    main()
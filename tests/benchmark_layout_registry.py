@@ -0,0 +1,43 @@
+# Times LayoutRegistry.lookup for CSIM and MinXSS beacons with just the two default missions registered and again with
+# 200 more, to show dispatch cost doesn't grow with the number of missions.
+# Run from the repository root: python tests/benchmark_layout_registry.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ccsds
+from csim_parser import BEACON_DECODER
+from example_data import get_csim_example_packet, get_example_data
+from layout_registry import PacketLayout, make_default_registry
+
+number_of_lookups = 200000
+
+
+def time_lookups(registry, packet):
+    start_time = time.perf_counter()
+    for _ in range(number_of_lookups):
+        registry.lookup(packet)
+    return (time.perf_counter() - start_time) / number_of_lookups
+
+
+def main():
+    packets = [('CSIM', bytes(get_csim_example_packet())), ('MinXSS', bytes(get_example_data(1)))]
+    registry = make_default_registry(load_plugins=False)
+    lookup_times = [time_lookups(registry, packet) for _, packet in packets]
+
+    for apid in range(0x100, 0x1c8):
+        sync_word = bytes([0x08 | apid >> 8, apid & 0xff])
+        registry.register(PacketLayout('Mission {}'.format(apid), sync_word, ccsds.get_apid(sync_word), None,
+                                       BEACON_DECODER, None))
+    crowded_lookup_times = [time_lookups(registry, packet) for _, packet in packets]
+
+    for (mission, _), lookup_time, crowded_lookup_time in zip(packets, lookup_times, crowded_lookup_times):
+        print('{0:<7}: {1:.2f} us/lookup with 2 missions, {2:.2f} us/lookup with {3}'.format(
+            mission, lookup_time * 1e6, crowded_lookup_time * 1e6, len(registry.layouts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Decodes a large synthetic .dat archive with every point and with just the two a battery plot needs, both as a batch
+# (parse_dat_file) and packet by packet (CsimDecoder.decode), to show what pushing the field list down saves.
+# Run from the repository root, e.g.:
+#   python tests/benchmark_projection.py --packets 200000
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csim_parser import BEACON_DECODER, CsimDecoder, parse_dat_file
+from example_data import get_csim_example_packet
+
+projected_fields = ['bct_battery_voltage', 'bct_box1_temp']
+number_of_streamed_packets = 20000
+
+
+def write_archive(dat_filename, packet, number_of_packets):
+    # Every beacon has its own values and there's a little junk between some of them, as when a pass drops bytes
+    random.seed(0)
+    with open(dat_filename, 'wb') as dat_file:
+        for _ in range(number_of_packets):
+            beacon = bytearray(packet)
+            beacon[305:325] = random.getrandbits(160).to_bytes(20, 'big')
+            dat_file.write(bytes(random.randrange(3)) + beacon)
+
+
+def time_call(function, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full vs projected decoding')
+    parser.add_argument('--packets', type=int, default=200000, help='Number of beacons in the archive')
+    args = parser.parse_args()
+
+    packet = bytes(get_csim_example_packet())
+    with tempfile.TemporaryDirectory() as dat_folder:
+        dat_filename = os.path.join(dat_folder, 'archive.dat')
+        write_archive(dat_filename, packet, args.packets)
+        archive_size = os.path.getsize(dat_filename)
+
+        full_batch, full_batch_time = time_call(parse_dat_file, dat_filename)
+        projected_batch, projected_batch_time = time_call(parse_dat_file, dat_filename, fields=projected_fields)
+
+    for name in projected_fields:
+        assert (full_batch[name] == projected_batch[name]).all()
+
+    csim_decoder = CsimDecoder()
+    csim_decoder.decode(packet, fields=projected_fields)  # Compile the projection before timing
+    _, full_stream_time = time_call(lambda: [csim_decoder.decode(packet) for _ in range(number_of_streamed_packets)])
+    _, projected_stream_time = time_call(lambda: [csim_decoder.decode(packet, fields=projected_fields)
+                                                  for _ in range(number_of_streamed_packets)])
+
+    print('{0} beacons, {1:.1f} MB; {2} points vs {3}'.format(len(full_batch['bct_bus_voltage']), archive_size / 1e6,
+                                                              len(BEACON_DECODER.scales), projected_fields))
+    print('parse_dat_file, every point:     {:8.1f} ms'.format(full_batch_time * 1e3))
+    print('parse_dat_file, 2 points:        {:8.1f} ms'.format(projected_batch_time * 1e3))
+    print('CsimDecoder.decode, every point: {:8.2f} us/packet'.format(
+        full_stream_time / number_of_streamed_packets * 1e6))
+    print('CsimDecoder.decode, 2 points:    {:8.2f} us/packet'.format(
+        projected_stream_time / number_of_streamed_packets * 1e6))
+
+
+if __name__ == '__main__':
+    main()
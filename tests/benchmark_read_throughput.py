@@ -0,0 +1,63 @@
+# Measures how fast ConnectSocket turns a stream of beacons into packets.
+# Run from the repository root: python tests/benchmark_read_throughput.py
+# A chunk size of 1 reproduces the old one-byte-per-recv behavior for comparison.
+# Each chunk size is run again with the raw capture tap writing to a temporary file.
+# For reference, on a shared Linux VM: about 0.3 MB/s at chunk size 1, 25 MB/s at 256, 35 MB/s at 4096 and 36 MB/s
+# at 65536 (5000 beacons through a socketpair). Framing and the Python per-read overhead set the ceiling, not recv.
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from connect_port_get_packet import ConnectSocket
+from example_data import get_csim_example_data
+from raw_capture import RawCaptureWriter
+
+number_of_packets = 5000
+chunk_sizes = [1, 256, 4096, 65536]
+
+
+def send_packets(server_end, stream):
+    server_end.sendall(stream)
+    server_end.close()
+
+
+def measure_bytes_per_second(chunk_size, stream, raw_capture=None):
+    server_end, client_end = socket.socketpair()
+    connect_socket = ConnectSocket('localhost', '0', chunk_size=chunk_size)
+    connect_socket.client_socket = client_end
+    connect_socket.set_raw_capture(raw_capture, 'benchmark')
+
+    sender = threading.Thread(target=send_packets, args=(server_end, stream))
+    start_time = time.perf_counter()
+    sender.start()
+    packets_read = 0
+    while len(connect_socket.read_packet()) > 0:
+        packets_read += 1
+    elapsed_time = time.perf_counter() - start_time
+    sender.join()
+    client_end.close()
+
+    return packets_read, len(stream) / elapsed_time
+
+
+def main():
+    stream = (b'\x00' * 37 + bytes(get_csim_example_data())) * number_of_packets
+    with tempfile.TemporaryDirectory() as capture_folder:
+        for chunk_size in chunk_sizes:
+            packets_read, bytes_per_second = measure_bytes_per_second(chunk_size, stream)
+            raw_capture = RawCaptureWriter(os.path.join(capture_folder, '{}.cap'.format(chunk_size)))
+            _, captured_bytes_per_second = measure_bytes_per_second(chunk_size, stream, raw_capture)
+            raw_capture.close()
+            print('chunk size {0:>6}: {1:>6} packets, {2:>12,.0f} bytes/s, {3:>12,.0f} bytes/s with raw capture '
+                  '({4} reads dropped)'.format(chunk_size, packets_read, bytes_per_second, captured_bytes_per_second,
+                                              raw_capture.get_statistics()['records_dropped']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Drives ConnectSerial through a pseudo-terminal pair so serial reading and framing can be measured without a radio.
+# Linux (or any system with ptys) only. Run from the repository root, e.g.:
+#   python tests/benchmark_serial_pty.py --baud 115200 --packets 200
+#   python tests/benchmark_serial_pty.py --baud 0 --packets 5000  (as fast as the pty will go)
+# Reports frames/s, bytes/s, reader CPU time per frame and latency from a packet's last byte being written to
+# read_packet handing it back.
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from connect_port_get_packet import ConnectSerial
+from example_data import get_csim_example_data, get_csim_example_packet
+
+bits_per_byte = 10  # 8N1: start bit, 8 data bits, stop bit
+
+# time.thread_time is Python 3.7+. Before that, process time also counts the sender thread, which is mostly asleep.
+reader_cpu_time = getattr(time, 'thread_time', time.process_time)
+
+
+def send_beacons(master_fd, beacon, packet_length, number_of_packets, baud_rate, packet_sent_times):
+    # Each beacon goes out as the packet and then the trailing bytes, so the time the packet's last byte was written
+    # can be recorded. A baud rate of 0 means no pacing.
+    seconds_per_byte = bits_per_byte / baud_rate if baud_rate else 0
+    send_time = time.perf_counter()
+    for _ in range(number_of_packets):
+        for data in [beacon[:packet_length], beacon[packet_length:]]:
+            send_time += len(data) * seconds_per_byte
+            delay = send_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if len(data) == packet_length:
+                packet_sent_times.append(time.perf_counter())  # Before the write so the reader never beats it
+            os.write(master_fd, data)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serial read benchmark over a pty')
+    parser.add_argument('--baud', type=int, default=115200, help='Baud rate to pace the stream to; 0 for unpaced')
+    parser.add_argument('--packets', type=int, default=200, help='Number of beacons to send')
+    parser.add_argument('--read-timeout', type=float, default=0.1, help='ConnectSerial read timeout [s]')
+    args = parser.parse_args()
+
+    beacon = bytes(get_csim_example_data())
+    packet_length = len(get_csim_example_packet())
+
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)  # No echo or newline translation; ConnectSerial sets this too, but before it opens
+    connect_serial = ConnectSerial(os.ttyname(slave_fd), args.baud or 115200, None, read_timeout=args.read_timeout)
+    connect_serial.connect_to_port()
+
+    packet_sent_times = []
+    sender = threading.Thread(target=send_beacons, args=(master_fd, beacon, packet_length, args.packets, args.baud,
+                                                         packet_sent_times), daemon=True)
+    latencies = []
+    packets_read = 0
+    start_time = time.perf_counter()
+    start_cpu_time = reader_cpu_time()
+    sender.start()
+    while packets_read < args.packets:
+        packet = connect_serial.read_packet()
+        if len(packet) == 0:
+            if not sender.is_alive():
+                break  # Sender finished and nothing more is coming; some packets were lost
+            continue
+        latencies.append(time.perf_counter() - packet_sent_times[packets_read])
+        packets_read += 1
+    elapsed_time = time.perf_counter() - start_time
+    cpu_time = reader_cpu_time() - start_cpu_time
+
+    sender.join()
+    connect_serial.close()
+    os.close(master_fd)
+    os.close(slave_fd)
+
+    if not latencies:
+        print('No packets made it through.')
+        return
+    latencies.sort()
+    print('{0} of {1} packets at {2} baud in {3:.3f} s'.format(packets_read, args.packets, args.baud or 'unpaced',
+                                                                elapsed_time))
+    print('{0:,.1f} frames/s, {1:,.0f} bytes/s, {2:.1f} us reader CPU per frame'.format(
+        packets_read / elapsed_time, packets_read * len(beacon) / elapsed_time, cpu_time / packets_read * 1e6))
+    print('latency p50 {0:.3f} ms, p90 {1:.3f} ms, p99 {2:.3f} ms, max {3:.3f} ms'.format(
+        *[percentile(latencies, fraction) * 1e3 for fraction in [0.5, 0.9, 0.99]], latencies[-1] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Measures how many one-packet datagrams ConnectUdp takes in per second from a sender on another thread.
+# Run from the repository root: python tests/benchmark_udp_ingest.py
+
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from connect_port_get_packet import ConnectUdp
+from example_data import get_csim_example_packet
+
+number_of_datagrams = 50000
+
+
+def send_datagrams(address, packet):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(number_of_datagrams):
+        sender.sendto(packet, address)
+        if i % 100 == 0:
+            time.sleep(0)  # Let the reader in so the kernel receive buffer doesn't overflow
+    sender.close()
+
+
+def main():
+    packet = bytes(get_csim_example_packet())
+    connect_udp = ConnectUdp('127.0.0.1', 0, read_timeout=0.5).connect_to_port()
+    sender_thread = threading.Thread(target=send_datagrams, args=(connect_udp.udp_socket.getsockname(), packet))
+
+    start_time = time.perf_counter()
+    sender_thread.start()
+    datagrams_received = 0
+    while len(connect_udp.read_packet()) > 0:
+        datagrams_received += 1
+    elapsed_time = time.perf_counter() - start_time - connect_udp.read_timeout
+    sender_thread.join()
+    connect_udp.close()
+
+    print('{0} of {1} datagrams in {2:.3f} s: {3:,.0f} datagrams/s, {4:,.1f} MB/s'.format(
+        datagrams_received, number_of_datagrams, elapsed_time, datagrams_received / elapsed_time,
+        datagrams_received * len(packet) / elapsed_time / 1e6))
+
+
+if __name__ == '__main__':
+    main()
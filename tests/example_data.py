@@ -1,3 +1,27 @@
+import os
+import re
+
+
+def get_csim_example_data():
+    # CSIM beacon documented byte by byte in raw_data.txt at the top of the repository
+    raw_data_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'raw_data.txt')
+    with open(raw_data_filename) as raw_data_file:
+        raw_data = raw_data_file.read()
+    return bytearray(int(byte, 16) for byte in re.findall(r'^\d+:0x([0-9a-fA-F]{2})', raw_data, re.MULTILINE))
+
+
+def get_csim_example_packet():
+    # The beacon above as the framer cuts it: from the sync through the end of its second CCSDS segment
+    return get_csim_example_data()[:387]
+
+
+def get_csim_example_ax25_frames():
+    # The two AX.25 UI frames (as a KISS TNC delivers them) that carry the two halves of the beacon above
+    beacon = get_csim_example_data()
+    ax25_header = beacon[256:272]  # BCT-0 <- CSIM-0, UI frame, no layer 3
+    return [ax25_header + beacon[:256], ax25_header + beacon[272:387]]
+
+
 # TODO - update for CSIM
 def get_example_data(sample_number):
     if sample_number == 0:
@@ -0,0 +1,33 @@
+import struct
+from apid_demultiplexer import ApidDemultiplexer
+from csim_parser import CsimParser
+from example_data import get_csim_example_packet
+from log_message_parser import LogMessageParser
+from sync_framer import SyncFramer
+
+beacon = bytes(get_csim_example_packet())
+
+
+def make_log_packet(message, sequence_count=7):
+    data = message + b'\x00' * 3
+    return struct.pack('>HHH', 0x081D, 0xC000 | sequence_count, len(data) - 1) + data
+
+
+def test_framed_packets_go_to_their_decoders():
+    demultiplexer = ApidDemultiplexer()
+    demultiplexer.register(0x3F, lambda packet: CsimParser(packet).parse_packet())
+    demultiplexer.register(0x1D, lambda packet: LogMessageParser(packet).parse_packet())
+
+    stream = make_log_packet(b'Booted') + b'\xff\xff' + beacon + make_log_packet(b'Safe mode', 8)
+    results = [demultiplexer.dispatch(packet) for packet in SyncFramer().feed(stream)]
+
+    assert results[0] == {'apid': 0x1D, 'sequence_count': 7, 'message': 'Booted'}
+    assert results[1]['bct_time_valid'] == 0
+    assert results[2]['message'] == 'Safe mode'
+    assert demultiplexer.get_statistics() == {'packet_counts': {0x1D: 2, 0x3F: 1}, 'packets_dropped': 0}
+
+
+def test_unregistered_apid_is_counted_and_dropped():
+    demultiplexer = ApidDemultiplexer()
+    assert demultiplexer.dispatch(struct.pack('>HHH', 0x0801, 0xC000, 0) + b'\x00') is None
+    assert demultiplexer.get_statistics() == {'packet_counts': {0x01: 1}, 'packets_dropped': 1}
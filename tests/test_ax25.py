@@ -0,0 +1,52 @@
+import pytest
+from ax25 import Ax25Error, Ax25StationFilter, parse_ax25_frame
+from csim_parser import CsimParser
+from example_data import get_csim_example_ax25_frames, get_csim_example_data, get_example_data
+from kiss import KissDeframer
+
+csim_frames = get_csim_example_ax25_frames()
+
+
+def test_parse_csim_frame():
+    frame = parse_ax25_frame(csim_frames[0])
+
+    assert (frame.destination, frame.destination_ssid) == ('BCT', 0)
+    assert (frame.source, frame.source_ssid) == ('CSIM', 0)
+    assert frame.repeaters == ()
+    assert frame.control == 0x03
+    assert frame.pid == 0xF0
+    assert isinstance(frame.info, memoryview)
+    assert frame.info.obj is csim_frames[0]  # Zero copy
+    assert frame.info[0:2] == bytes([0x08, 0x3F])
+
+
+def test_parse_minxss_frame_from_kiss():
+    kiss_frame = KissDeframer().feed(get_example_data(5))[0]
+    frame = parse_ax25_frame(kiss_frame.payload)
+
+    assert (frame.destination, frame.source) == ('CQ', 'MINXSS')
+    assert frame.info[0:2] == bytes([0x08, 0x19])
+
+
+def test_not_a_ui_frame():
+    with pytest.raises(Ax25Error):
+        parse_ax25_frame(csim_frames[0][:10])
+    with pytest.raises(Ax25Error):
+        parse_ax25_frame(csim_frames[0][:14] + bytes([0x00, 0xF0]))
+
+
+def test_info_field_goes_straight_to_parser():
+    frame = csim_frames[0][:16] + get_csim_example_data()
+    telemetry = CsimParser(parse_ax25_frame(frame).info).parse_packet()
+    assert telemetry['bct_time_valid'] == 0
+    assert telemetry['bct_bus_voltage'] == 0x35d9 * 1e-3
+
+
+def test_station_filter():
+    minxss_payload = KissDeframer().feed(get_example_data(5))[0].payload
+    station_filter = Ax25StationFilter(['csim'])
+
+    assert station_filter.accepts(csim_frames[0])
+    assert not station_filter.accepts(minxss_payload)
+    assert not Ax25StationFilter([('CSIM', 1)]).accepts(csim_frames[1])
+    assert (station_filter.frames_accepted, station_filter.frames_rejected) == (1, 1)
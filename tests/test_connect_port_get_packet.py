@@ -1,4 +1,12 @@
-from connect_port_get_packet import ConnectSocket
+import asyncio
+import os
+import socket
+import threading
+import pytest
+from ax25 import Ax25StationFilter
+from connect_port_get_packet import AsyncConnectSocket, ConnectKissSocket, ConnectSerial, ConnectSocket, ConnectUdp
+from example_data import get_csim_example_ax25_frames, get_csim_example_packet
+from kiss import KissFrame, encode_kiss_frame
 
 
 class TestPort:
@@ -22,3 +30,249 @@ class TestPort:
     def can_read_packet(self):
         packet = self.connected_port.read_packet()
         assert len(packet) == 272
+
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason='Needs a pseudo-terminal')
+def test_serial_reads_packets_through_pty():
+    import tty
+    beacon = bytes(get_csim_example_packet())
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    connect_serial = ConnectSerial(os.ttyname(slave_fd), 115200, None, read_timeout=0.05).connect_to_port()
+    os.write(master_fd, b'\x00\x01' + beacon + beacon[:100])
+    os.write(master_fd, beacon[100:])
+
+    assert connect_serial.read_packet() == beacon
+    assert connect_serial.read_packet() == beacon
+    assert len(connect_serial.read_packet()) == 0  # Timed out
+
+    connect_serial.close()
+    os.close(master_fd)
+    os.close(slave_fd)
+
+
+def connect_socket_to_pair(chunk_size=4096):
+    # Stand in for a TCP/IP server with one end of a local socket pair
+    server_end, client_end = socket.socketpair()
+    connect_socket = ConnectSocket('localhost', '0', chunk_size=chunk_size)
+    connect_socket.client_socket = client_end
+    connect_socket.port_readable = True
+    return connect_socket, server_end
+
+
+def test_socket_bulk_read_returns_each_packet():
+    beacon = bytes(get_csim_example_packet())
+    connect_socket, server_end = connect_socket_to_pair(chunk_size=1000)
+    server_end.sendall(b'\x00\x01garbage' + beacon + beacon[:10])
+    server_end.sendall(beacon[10:] + b'\x00\x00')
+
+    assert connect_socket.read_packet() == beacon
+    assert connect_socket.read_packet() == beacon
+
+    server_end.close()
+    assert len(connect_socket.read_packet()) == 0
+    assert connect_socket.end_of_stream
+    connect_socket.close()
+
+
+def test_socket_finds_sync_split_across_reads():
+    beacon = bytes(get_csim_example_packet())
+    connect_socket, server_end = connect_socket_to_pair(chunk_size=3)
+    server_end.sendall(b'\xff\xff\x08')
+    server_end.sendall(beacon[1:])
+
+    assert connect_socket.read_packet() == beacon
+
+    server_end.close()
+    connect_socket.close()
+
+
+def test_socket_decodes_kiss_before_framing():
+    beacon = bytes(get_csim_example_packet())
+    connect_socket, server_end = connect_socket_to_pair()
+    connect_socket.set_decode_kiss(True)
+    server_end.sendall(encode_kiss_frame(beacon[:256]) + encode_kiss_frame(beacon[256:]))
+
+    assert connect_socket.read_packet() == beacon
+
+    server_end.close()
+    connect_socket.close()
+
+
+def test_socket_ignores_other_stations():
+    beacon = bytes(get_csim_example_packet())
+    ax25_frames = get_csim_example_ax25_frames()
+    other_station = ax25_frames[0][:7] + bytes(byte << 1 for byte in b'OTHER ') + ax25_frames[0][13:]
+    connect_socket, server_end = connect_socket_to_pair()
+    connect_socket.set_decode_kiss(True)
+    connect_socket.set_ax25_filter(Ax25StationFilter(['CSIM']))
+    server_end.sendall(b''.join(encode_kiss_frame(frame) for frame in [other_station] + ax25_frames))
+
+    assert connect_socket.read_packet() == beacon
+    assert connect_socket.ax25_filter.frames_rejected == 1
+
+    server_end.close()
+    connect_socket.close()
+
+
+def run_until_complete(coroutine):
+    # asyncio.run() is Python 3.7+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_async_socket_iterates_packets_until_peer_closes():
+    beacon = bytes(get_csim_example_packet())
+
+    async def serve_two_packets(reader, writer):
+        writer.write(b'\x00garbage' + beacon + beacon[:50])
+        await writer.drain()
+        writer.write(beacon[50:])
+        writer.close()
+
+    async def read_all_packets():
+        server = await asyncio.start_server(serve_two_packets, 'localhost', 0)
+        port = server.sockets[0].getsockname()[1]
+        connect_socket = await AsyncConnectSocket('localhost', port).connect_to_port()
+        assert connect_socket.port_readable
+
+        packets = []
+        async for packet in connect_socket:
+            packets.append(packet)
+        await connect_socket.close()
+        server.close()
+        await server.wait_closed()
+        return packets
+
+    assert run_until_complete(read_all_packets()) == [beacon, beacon]
+
+
+def test_async_socket_closes_on_cancel():
+    async def serve_nothing(reader, writer):
+        await reader.read()  # Hold the connection open until the client goes away
+        writer.close()
+
+    async def cancel_pending_read():
+        server = await asyncio.start_server(serve_nothing, 'localhost', 0)
+        port = server.sockets[0].getsockname()[1]
+        connect_socket = await AsyncConnectSocket('localhost', port).connect_to_port()
+
+        read_task = asyncio.ensure_future(connect_socket.read_packet())
+        await asyncio.sleep(0.05)
+        read_task.cancel()
+        try:
+            await read_task
+        except asyncio.CancelledError:
+            pass
+        server.close()
+        await server.wait_closed()
+        return connect_socket
+
+    connect_socket = run_until_complete(cancel_pending_read())
+    assert connect_socket.writer is None
+
+
+def test_async_socket_invalid_port_fails():
+    async def connect_to_nothing():
+        listener = socket.socket()
+        listener.bind(('localhost', 0))
+        port = listener.getsockname()[1]
+        listener.close()  # Nothing is listening on this port now
+        return await AsyncConnectSocket('localhost', port).connect_to_port()
+
+    assert run_until_complete(connect_to_nothing()).port_readable is False
+
+
+def start_stand_in_tnc(connections):
+    """
+    Stand in for a software TNC serving KISS over TCP. Accepts one connection per entry in connections, sends that
+    entry's bytes and hangs up. Stops listening before the last hang up so a client's reconnect finds nobody home.
+    """
+    listener = socket.socket()
+    listener.bind(('localhost', 0))
+    listener.listen(1)
+
+    def serve():
+        for i, data in enumerate(connections):
+            connection, _ = listener.accept()
+            if i == len(connections) - 1:
+                listener.close()
+            connection.sendall(data)
+            connection.close()
+
+    server_thread = threading.Thread(target=serve, daemon=True)
+    server_thread.start()
+    return listener.getsockname()[1], server_thread
+
+
+def test_kiss_socket_reads_frames_one_at_a_time():
+    ax25_frames = get_csim_example_ax25_frames()
+    port, server_thread = start_stand_in_tnc([b''.join(encode_kiss_frame(frame) for frame in ax25_frames)])
+    kiss_socket = ConnectKissSocket('localhost', port).connect_to_port()
+
+    assert kiss_socket.read_frame().payload == ax25_frames[0]
+    assert kiss_socket.read_frame().payload == ax25_frames[1]
+    assert kiss_socket.read_frame() is None
+
+    server_thread.join()
+    kiss_socket.close()
+
+
+def test_kiss_socket_keeps_ports_apart():
+    # Two radios sending the same beacon with their frames interleaved
+    beacon = bytes(get_csim_example_packet())
+    ax25_frames = get_csim_example_ax25_frames()
+    port, server_thread = start_stand_in_tnc([encode_kiss_frame(ax25_frames[0], port=0) +
+                                              encode_kiss_frame(ax25_frames[0], port=1) +
+                                              encode_kiss_frame(ax25_frames[1], port=1) +
+                                              encode_kiss_frame(ax25_frames[1], port=0) +
+                                              encode_kiss_frame(ax25_frames[0], port=2)])
+    kiss_socket = ConnectKissSocket('localhost', port, kiss_ports=[0, 1]).connect_to_port()
+
+    assert kiss_socket.read_packet() == beacon
+    assert kiss_socket.read_packet() == beacon
+    assert len(kiss_socket.read_packet()) == 0
+    assert kiss_socket.frames_received == {0: 2, 1: 2}
+
+    server_thread.join()
+    kiss_socket.close()
+
+
+def test_kiss_socket_framer_statistics_cover_every_port():
+    kiss_socket = ConnectKissSocket('localhost', 0, kiss_ports=[0, 1])
+    kiss_socket.frame_kiss_frame(KissFrame(1, 0, get_csim_example_ax25_frames()[0]))
+    kiss_socket.framers[0].resync_events = 2
+    kiss_socket.framers[1].resync_events = 3
+
+    assert kiss_socket.get_framer_statistics() == {'incomplete_packets': 0, 'resync_events': 5, 'false_syncs': 0}
+
+
+def test_udp_datagrams_are_whole_packets():
+    beacon = bytes(get_csim_example_packet())
+    connect_udp = ConnectUdp('127.0.0.1', 0).connect_to_port()
+    address = connect_udp.udp_socket.getsockname()
+    senders = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    for sender in senders:
+        sender.bind(('127.0.0.1', 0))
+    senders[0].sendto(beacon, address)
+    senders[0].sendto(beacon[:100], address)  # No framer, so a short datagram is still handed on as is
+    senders[1].sendto(beacon, address)
+
+    assert connect_udp.read_packet() == beacon
+    assert connect_udp.read_packet() == beacon[:100]
+    assert connect_udp.read_packet() == beacon
+    assert len(connect_udp.read_packet()) == 0  # Timed out
+
+    statistics = connect_udp.get_statistics()
+    assert statistics['{0}:{1}'.format(*senders[0].getsockname())] == {'datagrams_received': 2,
+                                                                        'bytes_received': len(beacon) + 100}
+    assert statistics['{0}:{1}'.format(*senders[1].getsockname())]['datagrams_received'] == 1
+
+    for sender in senders:
+        sender.close()
+    connect_udp.close()
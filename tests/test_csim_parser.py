@@ -0,0 +1,115 @@
+import os
+import pytest
+import struct
+from csim_parser import BEACON_DECODER, BEACON_DEFINITION_FILENAME, CsimDecoder, CsimParser, parse_dat_file, parse_packets
+from example_data import get_csim_example_data, get_csim_example_packet
+from telemetry_dictionary import TYPE_CODES, load_definition, parse_bits
+
+beacon = bytes(get_csim_example_data())
+beacon_points = load_definition(BEACON_DEFINITION_FILENAME)
+
+
+def decode_field_by_field(packet):
+    # The way parse_packet used to work: one decode_general call on a slice per field
+    csim_parser = CsimParser(packet)
+    telemetry = {}
+    for point in beacon_points:
+        nbytes = struct.calcsize(TYPE_CODES[point.type])
+        # decode_general's sn gives unsigned values and dn signed ones
+        dtype = 'double' if point.type == 'float64' else ('sn' if point.type.startswith('u') else 'dn')
+        field_bytes = packet[point.offset] if nbytes == 1 else packet[point.offset:point.offset + nbytes]
+        if point.bits is None:
+            telemetry[point.name] = csim_parser.decode_general(field_bytes, nbytes, dtype, conversion=point.scale)
+        else:
+            shift, width = parse_bits(point.bits)
+            raw_value = int(csim_parser.decode_general(field_bytes, nbytes, dtype))
+            telemetry[point.name] = (raw_value >> shift & (1 << width) - 1) * point.scale
+    return telemetry
+
+
+def test_compiled_layout_matches_decode_general():
+    assert CsimParser(beacon).parse_packet() == decode_field_by_field(beacon)
+
+    every_byte_set = bytes(beacon[:2]) + bytes([0xA5]) * (len(beacon) - 2)
+    assert CsimParser(every_byte_set).parse_packet() == decode_field_by_field(every_byte_set)
+
+
+def test_known_values():
+    telemetry = CsimParser(beacon).parse_packet()
+
+    assert telemetry['bct_tai_seconds'] == pytest.approx(481185565.6)
+    assert telemetry['bct_Q_BODY_WRT_ECI4'] == pytest.approx(1.0)
+    assert telemetry['bct_voltage_12p0'] == pytest.approx(11.8)
+    assert telemetry['bct_battery_voltage'] == pytest.approx(11.364)
+    assert telemetry['bct_position_wrt_eci1'] == 50000
+    assert telemetry['bct_velocity_wrt_eci1'] == 200000000
+    assert telemetry['bct_nadir_vector_body1'] == -25000
+    assert telemetry['bct_sun_vector_status'] == 2
+    assert telemetry['bct_mag_vector_valid'] == 1
+    assert telemetry['bct_battery1_temp'] == pytest.approx(0xdca8 * 5e-3)
+    assert telemetry['bct_battery2_temp'] == pytest.approx(0xdb84 * 5e-3)
+
+
+def test_every_point_decoded():
+    assert set(CsimParser(beacon).parse_packet()) == {point.name for point in beacon_points}
+
+
+def test_leading_bytes_and_memoryview():
+    telemetry = CsimParser(beacon).parse_packet()
+
+    assert CsimParser(b'\x00\x01\x02' + beacon).parse_packet() == telemetry
+    assert CsimParser(memoryview(beacon)).parse_packet() == telemetry
+
+
+def test_too_short():
+    assert CsimParser(beacon[:BEACON_DECODER.packet_length - 1]).parse_packet() is None
+    assert CsimParser(bytes(400)).parse_packet() is None
+
+
+
+def test_batch_matches_parse_packet(tmpdir):
+    packet = bytes(get_csim_example_packet())
+    telemetry = CsimParser(packet).parse_packet()
+    dat_filename = str(tmpdir.join('beacons.dat'))
+    with open(dat_filename, 'wb') as dat_file:
+        dat_file.write(b'\x00' * 7 + packet * 3 + packet[:100])
+
+    for batch in [parse_dat_file(dat_filename), parse_packets(packet * 3, stride=len(packet))]:
+        assert len(batch['bct_tai_seconds']) == 3
+        assert {name: values[2] for name, values in batch.items()} == telemetry
+
+    fields = ['bct_battery_voltage', 'bct_box1_temp']
+    batch = parse_dat_file(dat_filename, fields=fields)
+    assert {name: values[2] for name, values in batch.items()} == {name: telemetry[name] for name in fields}
+    assert CsimDecoder().decode(packet, fields=fields) == {name: telemetry[name] for name in fields}
+
+    tmpdir.join('empty.dat').write_binary(b'')
+    assert len(parse_dat_file(str(tmpdir.join('empty.dat')))['bct_bus_voltage']) == 0
+
+
+def test_decoder_matches_parser():
+    decoder = CsimDecoder()
+    telemetry = CsimParser(beacon).parse_packet()
+
+    assert decoder.decode(beacon) == telemetry
+    assert decoder.decode(memoryview(beacon)) == telemetry
+    assert decoder.decode(b'\x00\x01' + beacon) == telemetry
+    assert decoder.decode(beacon[:BEACON_DECODER.packet_length - 1]) is None
+    assert decoder.decode(bytes(400)) is None
+
+    record = decoder.decode_record(b'\x00\x01' + beacon)
+    assert record['bct_battery_voltage'] == telemetry['bct_battery_voltage']
+    assert record.materialize() == telemetry
+    assert decoder.decode_record(bytes(400)) is None
+
+
+def test_decoder_stays_off_the_filesystem(monkeypatch):
+    decoder = CsimDecoder()
+
+    def no_filesystem(*args, **kwargs):
+        raise AssertionError('Filesystem touched while decoding')
+
+    monkeypatch.setattr(os.path, 'exists', no_filesystem)
+    monkeypatch.setattr(os, 'makedirs', no_filesystem)
+    monkeypatch.setattr(os, 'stat', no_filesystem)
+    assert decoder.decode(beacon) == CsimParser(beacon).parse_packet()
@@ -0,0 +1,82 @@
+import socket
+import struct
+from connect_port_get_packet import ConnectSocket
+from example_data import get_csim_example_ax25_frames, get_csim_example_packet
+from frame_check import FrameChecker, crc16_x25, crc16_x25_bytewise, has_valid_fcs
+from kiss import encode_kiss_frame
+
+
+def add_fcs(frame):
+    return frame + struct.pack('<H', crc16_x25(frame))
+
+
+def test_crc16_x25_check_value():
+    assert crc16_x25(b'123456789') == 0x906E
+    assert crc16_x25_bytewise(b'123456789') == 0x906E
+
+
+def test_fast_crc_matches_bytewise():
+    for frame in get_csim_example_ax25_frames() + [b'', b'\x00', bytes(range(256))]:
+        assert crc16_x25(frame) == crc16_x25_bytewise(frame)
+        assert crc16_x25(memoryview(bytes(frame))) == crc16_x25_bytewise(frame)
+
+
+def test_fcs_catches_a_flipped_bit():
+    frame = bytearray(add_fcs(get_csim_example_ax25_frames()[0]))
+    assert has_valid_fcs(frame)
+    frame[100] ^= 0x04
+    assert not has_valid_fcs(frame)
+    assert not has_valid_fcs(b'\x00\x00')
+
+
+def test_checker_strips_fcs_and_archives_failures(tmpdir):
+    failed_frame_filename = str(tmpdir.join('failed_frames.dat'))
+    frame = get_csim_example_ax25_frames()[0]
+    good_frame = add_fcs(frame)
+    bad_frame = good_frame[:-1] + bytes([good_frame[-1] ^ 0xFF])
+    checker = FrameChecker(check_fcs=True, failed_frame_filename=failed_frame_filename)
+
+    assert checker.check_ax25_frame(good_frame) == frame
+    assert checker.check_ax25_frame(bad_frame) is None
+    assert checker.get_statistics()['frames_passed'] == 1
+    assert checker.get_statistics()['frames_failed'] == 1
+    with open(failed_frame_filename, 'rb') as failed_frame_file:
+        assert failed_frame_file.read() == bad_frame
+
+
+def test_fcs_is_left_alone_by_default():
+    frame = get_csim_example_ax25_frames()[0]
+    assert FrameChecker().check_ax25_frame(frame) is frame
+
+
+def test_packet_checks():
+    def starts_with_sync(packet):
+        return packet[0:2] == bytes([0x08, 0x3F])
+
+    checker = FrameChecker(packet_checks=[starts_with_sync])
+    assert checker.check_packet(get_csim_example_packet())
+    assert not checker.check_packet(bytes(10))
+    assert checker.get_statistics()['packets_passed'] == 1
+    assert checker.get_statistics()['packets_failed'] == 1
+
+
+def test_socket_drops_frames_failing_fcs():
+    beacon = bytes(get_csim_example_packet())
+    ax25_frames = get_csim_example_ax25_frames()
+    corrupted_frame = bytearray(add_fcs(ax25_frames[0]))
+    corrupted_frame[50] ^= 0x01
+
+    server_end, client_end = socket.socketpair()
+    connect_socket = ConnectSocket('localhost', '0')
+    connect_socket.client_socket = client_end
+    connect_socket.port_readable = True
+    connect_socket.set_decode_kiss(True)
+    connect_socket.set_frame_checker(FrameChecker(check_fcs=True))
+    server_end.sendall(b''.join(encode_kiss_frame(frame) for frame in
+                                [corrupted_frame] + [add_fcs(frame) for frame in ax25_frames]))
+
+    assert connect_socket.read_packet() == beacon
+    assert connect_socket.frame_checker.frames_failed == 1
+
+    server_end.close()
+    connect_socket.close()
@@ -0,0 +1,81 @@
+import socket
+from connect_port_get_packet import ConnectSocket, ConnectUdp
+from example_data import get_csim_example_packet
+from ingest_manager import IngestManager
+
+beacon = bytes(get_csim_example_packet())
+
+
+def connect_socket_to_pair():
+    server_end, client_end = socket.socketpair()
+    connect_socket = ConnectSocket('localhost', '0')
+    connect_socket.client_socket = client_end
+    return connect_socket, server_end
+
+
+def drain(packet_queue):
+    packets = []
+    while not packet_queue.empty():
+        packets.append(packet_queue.get_nowait())
+    return packets
+
+
+def test_packets_from_every_source_are_merged_and_tagged():
+    ingest_manager = IngestManager()
+    radio_socket, radio_server = connect_socket_to_pair()
+    remote_socket, remote_server = connect_socket_to_pair()
+    ingest_manager.add_source('radio', radio_socket)
+    ingest_manager.add_source('remote', remote_socket)
+
+    radio_server.sendall(b'\x00\x00' + beacon + beacon[:100])
+    remote_server.sendall(beacon[:200])
+    while ingest_manager.poll(timeout=0.1):
+        pass
+    remote_server.sendall(beacon[200:])
+    radio_server.sendall(beacon[100:])
+    while ingest_manager.poll(timeout=0.1):
+        pass
+
+    packets = drain(ingest_manager.packet_queue)
+    assert sorted(packet.source_id for packet in packets) == ['radio', 'radio', 'remote']
+    assert all(packet.packet == beacon for packet in packets)
+    assert all(packet.receive_time > 0 for packet in packets)
+
+    statistics = ingest_manager.get_statistics()
+    assert statistics['radio'] == {'bytes_received': 2 + 2 * len(beacon), 'packets_framed': 2}
+    assert statistics['remote'] == {'bytes_received': len(beacon), 'packets_framed': 1}
+
+    radio_server.close()
+    remote_server.close()
+    ingest_manager.close()
+
+
+def test_closed_source_is_dropped():
+    ingest_manager = IngestManager()
+    radio_socket, radio_server = connect_socket_to_pair()
+    ingest_manager.add_source('radio', radio_socket)
+
+    radio_server.sendall(beacon)
+    radio_server.close()
+    ingest_manager.run(poll_interval=0.1)  # Returns once the only source is gone
+
+    assert 'radio' not in ingest_manager.sources
+    assert len(drain(ingest_manager.packet_queue)) == 1
+    ingest_manager.close()
+
+
+def test_empty_udp_datagram_keeps_source():
+    ingest_manager = IngestManager()
+    connect_udp = ConnectUdp('127.0.0.1', 0).connect_to_port()
+    ingest_manager.add_source('sdr', connect_udp)
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.sendto(b'', connect_udp.udp_socket.getsockname())
+    sender.sendto(beacon, connect_udp.udp_socket.getsockname())
+    for _ in range(2):  # One datagram per poll
+        ingest_manager.poll(timeout=1.0)
+
+    assert 'sdr' in ingest_manager.sources
+    assert [packet.packet for packet in drain(ingest_manager.packet_queue)] == [beacon]
+    sender.close()
+    ingest_manager.close()
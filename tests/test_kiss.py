@@ -0,0 +1,50 @@
+import pytest
+from kiss import KissDeframer, KissFrame, encode_kiss_frame
+
+
+def test_frames_round_trip_with_escapes():
+    payload = bytes([0x08, 0x3F, 0xC0, 0x01, 0xDB, 0x02, 0xDB, 0xDC, 0xC0, 0xDB])
+    deframer = KissDeframer()
+    frames = deframer.feed(encode_kiss_frame(payload) + encode_kiss_frame(b'second', port=2))
+
+    assert frames == [KissFrame(0, 0, payload), KissFrame(2, 0, b'second')]
+    assert deframer.frames_decoded == 2
+
+
+def test_escaped_fesc_followed_by_tfend_is_not_a_fend():
+    # Literal DB DC in the data is sent as DB DD DC. Unescaping FEND first would wrongly turn it into DB C0.
+    frames = KissDeframer().feed(bytes([0xC0, 0x00, 0xDB, 0xDD, 0xDC, 0xC0]))
+    assert frames[0].payload == bytes([0xDB, 0xDC])
+
+
+def test_frames_split_anywhere_across_reads():
+    payload = bytes(range(256)) * 2
+    stream = b'noise' + encode_kiss_frame(payload, port=1) + encode_kiss_frame(payload)
+    for chunk_size in [1, 2, 3, 7, 100]:
+        deframer = KissDeframer()
+        frames = []
+        for i in range(0, len(stream), chunk_size):
+            frames += deframer.feed(stream[i:i + chunk_size])
+        assert frames == [KissFrame(1, 0, payload), KissFrame(0, 0, payload)]
+
+
+def test_bad_escape_drops_only_that_frame():
+    deframer = KissDeframer()
+    frames = deframer.feed(bytes([0xC0, 0x00, 0x01, 0xDB, 0x05, 0x02, 0xC0]) + encode_kiss_frame(b'ok'))
+
+    assert frames == [KissFrame(0, 0, b'ok')]
+    assert deframer.frames_dropped == 1
+
+
+def test_command_nibble_and_padding():
+    frames = KissDeframer().feed(bytes([0xC0, 0xC0, 0xC0, 0x31, 0x0A, 0xC0]))
+    assert frames == [KissFrame(3, 1, b'\x0a')]
+
+
+def test_type_bytes_that_need_escaping_round_trip():
+    deframer = KissDeframer()
+    frames = deframer.feed(encode_kiss_frame(b'\xc0data', port=12) + encode_kiss_frame(b'cmd', port=13, command=11))
+
+    assert frames == [KissFrame(12, 0, b'\xc0data'), KissFrame(13, 11, b'cmd')]
+    with pytest.raises(ValueError):
+        encode_kiss_frame(b'', port=16)
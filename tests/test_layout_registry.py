@@ -0,0 +1,68 @@
+import pytest
+import layout_registry
+from csim_parser import BEACON_DECODER, CsimParser
+from example_data import get_csim_example_packet, get_example_data
+from layout_registry import ENTRY_POINT_GROUP, PacketLayout, make_default_registry, make_layout
+
+csim_packet = bytes(get_csim_example_packet())
+minxss_packet = bytes(get_example_data(1))
+
+
+def make_test_layouts():
+    # Stands in for a plugin's entry point
+    return [PacketLayout('TestSat', b'\x08\x42', 0x42, None, BEACON_DECODER, None)]
+
+
+def test_dispatch_by_sync_word_and_apid():
+    registry = make_default_registry(load_plugins=False)
+
+    assert registry.decode(csim_packet) == ('CSIM', CsimParser(csim_packet).parse_packet())
+
+    mission, telemetry = registry.decode(minxss_packet)
+    assert mission == 'MinXSS'
+    assert len(telemetry) == 27
+    assert telemetry['FlightModel'] == 1
+    assert telemetry['CommandAcceptCount'] == 2691
+    assert telemetry['SpacecraftMode'] == 4
+    assert telemetry['EnableSps'] == 1
+    assert telemetry['SpsX'] == pytest.approx(-0.36, abs=0.005)
+    assert telemetry['CdhBoardTemperature'] == pytest.approx(12.25)
+    assert telemetry['SolarPanelMinusYTemperature'] == pytest.approx(52.23, abs=0.005)
+    assert telemetry['BatteryTemperature'] == pytest.approx(12.34, abs=0.005)
+    assert telemetry['BatteryVoltage'] == pytest.approx(7.97, abs=0.005)
+    assert telemetry['BatteryChargeCurrent'] == pytest.approx(347.4, abs=0.05)
+    assert telemetry['SolarPanelPlusXCurrent'] == pytest.approx(536, abs=0.5)
+    assert telemetry['SolarPanelPlusXVoltage'] == pytest.approx(9.77, abs=0.005)
+
+    assert registry.decode(b'\x08\x1d' + csim_packet[2:]) is None  # Log messages have no layout registered
+    assert registry.decode(minxss_packet[:100]) is None
+    assert registry.get_statistics() == {'packet_counts': {'CSIM': 1, 'MinXSS': 1}, 'packets_unknown': 1,
+                                         'packets_too_short': 1}
+
+
+def test_spacecraft_id():
+    registry = make_default_registry(load_plugins=False)
+    flight_model_1 = make_layout('MinXSS-1', b'\x08\x19', layout_registry.MINXSS_DEFINITION_FILENAME,
+                                 spacecraft_id=1, spacecraft_id_field='FlightModel')
+    registry.register(flight_model_1)
+    assert registry.lookup(minxss_packet) is flight_model_1
+
+    # Any other flight model still gets the mission wide layout
+    flight_model_2_packet = bytearray(minxss_packet)
+    flight_model_2_packet[51] = 0x20
+    assert registry.lookup(flight_model_2_packet).mission == 'MinXSS'
+
+    with pytest.raises(ValueError):
+        registry.register(flight_model_1)
+
+
+def test_plugins(monkeypatch):
+    importlib_metadata = pytest.importorskip('importlib.metadata')  # Python 3.8+
+    entry_points = [importlib_metadata.EntryPoint('testsat', 'test_layout_registry:make_test_layouts',
+                                                  ENTRY_POINT_GROUP),
+                    importlib_metadata.EntryPoint('broken', 'no_such_module:layouts', ENTRY_POINT_GROUP)]
+    monkeypatch.setattr(layout_registry, 'find_entry_points', lambda group: entry_points)
+    registry = make_default_registry()
+
+    assert registry.lookup(b'\x08\x42' + csim_packet[2:]).mission == 'TestSat'
+    assert registry.lookup(csim_packet).mission == 'CSIM'
@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+import pytest
+from pipeline import BLOCK, DROP_NEWEST, DROP_OLDEST, BoundedQueue, Pipeline, QueueClosed
+
+
+def drain(bounded_queue):
+    items = []
+    while True:
+        try:
+            items.append(bounded_queue.get(block=False))
+        except (queue.Empty, QueueClosed):
+            return items
+
+
+def test_drop_oldest_keeps_newest():
+    bounded_queue = BoundedQueue(3, DROP_OLDEST)
+    for i in range(5):
+        assert bounded_queue.put(i)
+
+    assert drain(bounded_queue) == [2, 3, 4]
+    assert bounded_queue.get_statistics() == {'depth': 0, 'max_depth': 3, 'items_put': 5, 'items_dropped': 2}
+
+
+def test_drop_newest_keeps_oldest():
+    bounded_queue = BoundedQueue(3, DROP_NEWEST)
+    assert [bounded_queue.put(i) for i in range(5)] == [True, True, True, False, False]
+
+    assert drain(bounded_queue) == [0, 1, 2]
+    assert bounded_queue.get_statistics()['items_dropped'] == 2
+
+
+def test_block_waits_for_room():
+    bounded_queue = BoundedQueue(1, BLOCK)
+    bounded_queue.put('first')
+    with pytest.raises(queue.Full):
+        bounded_queue.put('second', timeout=0.01)
+
+    threading.Timer(0.05, bounded_queue.get).start()
+    bounded_queue.put('second', timeout=5)
+    assert drain(bounded_queue) == ['second']
+
+
+def test_closed_queue_drains_then_raises():
+    bounded_queue = BoundedQueue(10)
+    bounded_queue.put('last')
+    bounded_queue.close()
+
+    assert bounded_queue.get() == 'last'
+    with pytest.raises(QueueClosed):
+        bounded_queue.get()
+
+
+def test_slow_consumer_never_stalls_producer():
+    def slow_save(item):
+        time.sleep(0.01)
+
+    test_pipeline = Pipeline()
+    test_pipeline.add_queue('packets', 1000, DROP_OLDEST)
+    test_pipeline.add_queue('saving', 5, DROP_NEWEST)
+    test_pipeline.add_queue('display', 1000, DROP_OLDEST)
+    test_pipeline.add_stage('decode', lambda packet: packet * 2, 'packets', ['saving', 'display'])
+    test_pipeline.add_stage('save', slow_save, 'saving')
+    test_pipeline.start()
+
+    start_time = time.monotonic()
+    for packet in range(100):
+        test_pipeline.queues['packets'].put(packet)
+    assert time.monotonic() - start_time < 0.5
+    test_pipeline.stop(timeout=5)
+
+    assert drain(test_pipeline.queues['display']) == [packet * 2 for packet in range(100)]
+    statistics = test_pipeline.get_statistics()
+    assert statistics['stages']['decode'] == {'items_handled': 100, 'errors': 0}
+    assert statistics['queues']['saving']['items_dropped'] > 0
+    assert statistics['stages']['save']['items_handled'] + statistics['queues']['saving']['items_dropped'] == 100
+
+
+def test_stage_survives_handler_errors():
+    test_pipeline = Pipeline()
+    test_pipeline.add_queue('in', 10)
+    test_pipeline.add_queue('out', 10)
+    test_pipeline.add_stage('invert', lambda value: 1 / value, 'in', ['out'])
+    test_pipeline.start()
+    for value in [1, 0, 2]:
+        test_pipeline.queues['in'].put(value)
+    test_pipeline.stop(timeout=5)
+
+    assert drain(test_pipeline.queues['out']) == [1.0, 0.5]
+    assert test_pipeline.get_statistics()['stages']['invert']['errors'] == 1
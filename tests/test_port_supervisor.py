@@ -0,0 +1,99 @@
+import threading
+import pytest
+from connect_port_get_packet import ConnectKissSocket, ConnectSocket
+from example_data import get_csim_example_ax25_frames, get_csim_example_packet
+from kiss import encode_kiss_frame
+from port_supervisor import (CONNECTED, CONNECTING, DISCONNECTED, KEEP_PARTIAL, STOPPED, ExponentialBackoff,
+                             PortSupervisor)
+from test_connect_port_get_packet import start_stand_in_tnc
+
+beacon = bytes(get_csim_example_packet())
+
+
+def test_backoff_grows_to_max_with_jitter():
+    backoff = ExponentialBackoff(initial_delay=1, max_delay=10, multiplier=2, jitter=0.25)
+    delays = [backoff.next_delay() for _ in range(6)]
+
+    for delay, expected_delay in zip(delays, [1, 2, 4, 8, 10, 10]):
+        assert 0.75 * expected_delay <= delay <= 1.25 * expected_delay
+    backoff.reset()
+    assert backoff.next_delay() <= 1.25
+
+
+def test_bad_policy():
+    with pytest.raises(ValueError):
+        PortSupervisor(ConnectSocket('localhost', 0), partial_packet_policy='sometimes')
+
+
+def test_reconnects_after_peer_closes():
+    kiss_beacon = b''.join(encode_kiss_frame(frame) for frame in get_csim_example_ax25_frames())
+    # The first connection drops partway through a beacon; that half beacon must not join up with the next one
+    port, server_thread = start_stand_in_tnc([kiss_beacon + encode_kiss_frame(get_csim_example_ax25_frames()[0]),
+                                              kiss_beacon])
+    states = []
+    supervisor = PortSupervisor(ConnectKissSocket('localhost', port).connect_to_port(),
+                                backoff=ExponentialBackoff(initial_delay=0),
+                                state_callbacks=[lambda old_state, state: states.append(state)])
+
+    assert supervisor.read_packet() == beacon
+    assert supervisor.read_packet() == beacon
+    assert states == [DISCONNECTED, CONNECTING, CONNECTED]
+    assert supervisor.get_statistics() == {'state': CONNECTED, 'connections_lost': 1, 'reconnects': 1}
+
+    server_thread.join()
+    supervisor.stop()
+    assert supervisor.read_packet() == bytes()
+    assert states[-1] == STOPPED
+
+
+def test_keep_partial_packet_across_reconnect():
+    port, server_thread = start_stand_in_tnc([beacon[:200], beacon[200:]])
+    supervisor = PortSupervisor(ConnectSocket('localhost', port).connect_to_port(),
+                                backoff=ExponentialBackoff(initial_delay=0), partial_packet_policy=KEEP_PARTIAL)
+
+    assert supervisor.read_packet() == beacon
+
+    server_thread.join()
+    supervisor.stop()
+
+
+class StopDuringConnectPort:
+    # Connects fine, but stop() gets called while it's connecting
+    def __init__(self):
+        self.port_readable = False
+        self.end_of_stream = False
+        self.supervisor = None
+        self.closed = False
+
+    def connect_to_port(self):
+        self.supervisor.stop()
+        self.closed = False
+        self.port_readable = True
+        return self
+
+    def close(self):
+        self.closed = True
+        self.port_readable = False
+
+
+def test_port_opened_after_stop_is_closed():
+    port = StopDuringConnectPort()
+    supervisor = PortSupervisor(port, backoff=ExponentialBackoff(initial_delay=0))
+    port.supervisor = supervisor
+
+    assert supervisor.read_packet() == bytes()
+    assert port.closed
+    assert supervisor.state == STOPPED
+
+
+def test_stop_wakes_up_reconnect_wait():
+    port, server_thread = start_stand_in_tnc([b''])
+    supervisor = PortSupervisor(ConnectSocket('localhost', port).connect_to_port(),
+                                backoff=ExponentialBackoff(initial_delay=60))
+    read_thread = threading.Thread(target=supervisor.read_packet)
+    read_thread.start()
+    server_thread.join()
+
+    supervisor.stop()
+    read_thread.join(timeout=5)
+    assert not read_thread.is_alive()
@@ -0,0 +1,109 @@
+import errno
+import pytest
+from example_data import get_csim_example_packet
+from raw_capture import RawCaptureWriter, ReplayRawCapture, read_raw_capture
+from test_connect_port_get_packet import connect_socket_to_pair
+
+beacon = bytes(get_csim_example_packet())
+
+
+def test_records_round_trip(tmpdir):
+    capture_filename = str(tmpdir.join('capture.cap'))
+    raw_capture = RawCaptureWriter(capture_filename)
+    raw_capture.write('COM3', b'\x01\x02\x03')
+    raw_capture.write('localhost:8001', memoryview(bytearray(b'\x04\x05')))
+    raw_capture.close()
+
+    records = list(read_raw_capture(capture_filename))
+    assert [(record.source_id, record.data) for record in records] == [('COM3', b'\x01\x02\x03'),
+                                                                        ('localhost:8001', b'\x04\x05')]
+    assert records[0].timestamp <= records[1].timestamp
+    assert raw_capture.get_statistics() == {'records_written': 2, 'bytes_written': 5, 'records_dropped': 0,
+                                            'write_errors': 0}
+
+
+def test_source_id_too_long_for_header(tmpdir):
+    capture_filename = str(tmpdir.join('capture.cap'))
+    raw_capture = RawCaptureWriter(capture_filename)
+    raw_capture.write('COM3', b'abc')
+    with pytest.raises(ValueError):
+        raw_capture.write('a' * 300, b'abc')
+    raw_capture.close()
+
+    assert [record.data for record in read_raw_capture(capture_filename)] == [b'abc']
+
+
+class DiskFillsUp:
+    """
+    Stand in for the capture file that fails with ENOSPC once bytes_free have been written
+    """
+    def __init__(self, file, bytes_free):
+        self.file = file
+        self.bytes_free = bytes_free
+
+    def write(self, data):
+        if len(data) > self.bytes_free:
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        self.bytes_free -= len(data)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def test_write_failure_stops_capture_and_keeps_what_was_written(tmpdir):
+    capture_filename = str(tmpdir.join('capture.cap'))
+    raw_capture = RawCaptureWriter(capture_filename)
+    raw_capture.file = DiskFillsUp(raw_capture.file, bytes_free=50)
+    raw_capture.write('COM3', b'first')
+    raw_capture.write('COM3', b'x' * 100)
+    raw_capture.close()
+    raw_capture.write('COM3', b'after')  # Dropped without complaint once capturing has stopped
+
+    assert [record.data for record in read_raw_capture(capture_filename)] == [b'first']
+    assert not raw_capture.capturing
+    assert raw_capture.get_statistics()['write_errors'] == 1
+
+
+def test_appends_and_stops_at_cut_off_record(tmpdir):
+    capture_filename = str(tmpdir.join('capture.cap'))
+    for data in [b'first', b'second']:
+        raw_capture = RawCaptureWriter(capture_filename)
+        raw_capture.write('COM3', data)
+        raw_capture.close()
+    with open(capture_filename, 'ab') as capture_file:
+        capture_file.write(b'\x00' * 5)  # Half a record header, as if the program died mid write
+
+    assert [record.data for record in read_raw_capture(capture_filename)] == [b'first', b'second']
+
+
+def test_not_a_capture_file(tmpdir):
+    dat_filename = tmpdir.join('beacons.dat')
+    dat_filename.write_binary(beacon)
+    with pytest.raises(ValueError):
+        list(read_raw_capture(str(dat_filename)))
+
+
+def test_port_reads_are_captured_and_replay_through_framer(tmpdir):
+    capture_filename = str(tmpdir.join('capture.cap'))
+    raw_capture = RawCaptureWriter(capture_filename)
+    connect_socket, server_end = connect_socket_to_pair(chunk_size=100)
+    connect_socket.set_raw_capture(raw_capture, 'localhost:8001')
+    server_end.sendall(b'noise' + beacon + beacon[:50])
+    server_end.close()
+    assert connect_socket.read_packet() == beacon
+    assert len(connect_socket.read_packet()) == 0
+    connect_socket.close()
+    raw_capture.close()
+
+    # Reads from another port mixed into the same file are left out of the replay
+    raw_capture = RawCaptureWriter(capture_filename)
+    raw_capture.write('COM3', beacon)
+    raw_capture.close()
+
+    records = list(read_raw_capture(capture_filename))
+    assert b''.join(record.data for record in records[:-1]) == b'noise' + beacon + beacon[:50]
+    replay = ReplayRawCapture(capture_filename, source_id='localhost:8001').connect_to_port()
+    assert list(replay.packets()) == [beacon]
+    assert replay.end_of_stream
+    replay.close()
@@ -0,0 +1,55 @@
+import time
+from example_data import get_csim_example_packet
+from replay_dat_file import ReplayDatFile
+
+beacon = bytes(get_csim_example_packet())
+
+
+def write_dat_file(path, number_of_packets):
+    with open(str(path), 'wb') as dat_file:
+        dat_file.write(beacon * number_of_packets)
+
+
+def test_replay_folder_as_fast_as_possible(tmpdir):
+    write_dat_file(tmpdir.join('2018-12-04T01_00_00_K0ABC_40.0_-105.0.dat'), 3)
+    write_dat_file(tmpdir.join('2018-12-04T02_00_00_K0ABC_40.0_-105.0.dat'), 2)
+    write_dat_file(tmpdir.join('2018-12-04T03_00_00_K0ABC_40.0_-105.0.dat'), 0)
+
+    replay = ReplayDatFile(str(tmpdir), chunk_size=1000).connect_to_port()
+    assert replay.port_readable
+    assert list(replay.packets()) == [beacon] * 5
+    replay.close()
+
+
+def test_replay_paced(tmpdir):
+    write_dat_file(tmpdir.join('pass.dat'), 4)
+
+    replay = ReplayDatFile(str(tmpdir.join('pass.dat')), speed=100, beacon_period=2.0).connect_to_port()
+    start_time = time.monotonic()
+    assert len(list(replay.packets())) == 4
+    assert time.monotonic() - start_time >= 3 * 2.0 / 100
+    replay.close()
+
+
+def test_replay_file_ending_in_partial_packet(tmpdir):
+    # The cut off packet spans two reads, so the framer still holds part of it when the next file is opened
+    with open(str(tmpdir.join('a.dat')), 'wb') as dat_file:
+        dat_file.write(beacon + beacon[:150])
+    write_dat_file(tmpdir.join('b.dat'), 1)
+
+    replay = ReplayDatFile(str(tmpdir), chunk_size=100).connect_to_port()
+    packets = list(replay.packets())
+    assert packets[0] == beacon
+    assert packets[-1] == beacon
+    replay.close()
+
+
+def test_close_mid_replay(tmpdir):
+    write_dat_file(tmpdir.join('pass.dat'), 3)
+
+    replay = ReplayDatFile(str(tmpdir.join('pass.dat')), chunk_size=100).connect_to_port()
+    assert replay.read_packet() == beacon
+    chunk = replay.read_data()  # Held onto, as the raw capture queue would
+    replay.close()
+    assert len(chunk) == 100
+    assert replay.read_packet() == bytes()
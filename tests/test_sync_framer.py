@@ -0,0 +1,132 @@
+import struct
+from sync_framer import SyncFramer
+from example_data import get_csim_example_data, get_csim_example_packet
+
+beacon = bytes(get_csim_example_packet())
+
+
+def make_unsegmented_packet(data_length):
+    return struct.pack('>HHH', 0x083F, 0xC000, data_length - 1) + bytes(i % 256 for i in range(data_length))
+
+
+def test_packets_come_out_whole():
+    framer = SyncFramer()
+    packets = list(framer.feed(b'\x00\x01\x02' + beacon + b'\xaa' + beacon))
+
+    assert packets == [beacon, beacon]
+    assert all(isinstance(packet, bytes) for packet in packets)
+
+
+def test_packet_spread_over_many_reads():
+    framer = SyncFramer()
+    packets = []
+    for i in range(0, len(beacon), 7):
+        packets += list(framer.feed(beacon[i:i + 7]))
+
+    assert packets == [beacon]
+
+
+def test_sync_split_across_reads():
+    framer = SyncFramer()
+    assert list(framer.feed(b'\xff\xff\x08')) == []
+    assert list(framer.feed(beacon[1:])) == [beacon]
+
+
+def test_many_buffered_packets_are_each_searched_once():
+    # With the log packet pattern never turning up, each packet start used to be searched for to the end of the
+    # buffer, so framing a big read took time in the square of its length
+    framer = SyncFramer()
+    bytes_searched = []
+    sync_search = framer.sync_search
+
+    def counting_sync_search(buffer, start_index, stop_index):
+        match = sync_search(buffer, start_index, stop_index)
+        bytes_searched.append((match.start() if match else stop_index) - start_index)
+        return match
+
+    framer.sync_search = counting_sync_search
+    stream = beacon * 1000
+    assert len(list(framer.feed(stream))) == 1000
+    assert sum(bytes_searched) < 2 * len(stream)
+
+
+def test_garbage_is_not_kept():
+    framer = SyncFramer()
+    assert list(framer.feed(b'\x00' * 10000)) == []
+    assert len(framer.buffer) < framer.sync_length
+
+    assert list(framer.feed(beacon[:100])) == []
+    assert len(framer.buffer) == 100
+
+
+def test_segmented_beacon_is_cut_at_end_of_last_segment():
+    documented_beacon = bytes(get_csim_example_data())  # Runs 13 bytes past the end of the second segment
+    framer = SyncFramer()
+
+    assert list(framer.feed(documented_beacon[:386])) == []
+    assert list(framer.feed(documented_beacon[386:])) == [documented_beacon[:387]]
+    assert len(framer.buffer) < framer.sync_length  # The trailing bytes hold no sync
+
+
+def test_short_and_long_packets():
+    short_packet = make_unsegmented_packet(10)
+    long_packet = make_unsegmented_packet(900)
+    framer = SyncFramer()
+
+    assert list(framer.feed(short_packet + long_packet + short_packet)) == [short_packet, long_packet, short_packet]
+
+
+def test_length_too_long_is_a_false_sync():
+    framer = SyncFramer(max_packet_length=500)
+    packets = list(framer.feed(make_unsegmented_packet(900)[:50] + beacon))
+
+    assert packets == [beacon]
+
+
+def test_missing_last_segment_is_dropped():
+    framer = SyncFramer(max_segment_gap=32)
+    packets = list(framer.feed(beacon[:256] + b'\x00' * 100 + beacon))
+
+    assert packets == [beacon]
+    assert framer.incomplete_packets == 1
+
+
+def test_dropped_byte_resyncs_on_next_packet():
+    damaged_beacon = beacon[:300] + beacon[301:]  # Second segment now runs one byte into the next beacon
+    framer = SyncFramer()
+    packets = list(framer.feed(damaged_beacon + beacon + beacon))
+
+    assert packets == [beacon, beacon]
+    assert framer.resync_events == 1
+
+
+def test_dropped_bytes_resync_when_fed_a_byte_at_a_time():
+    short_packet = make_unsegmented_packet(50)
+    stream = short_packet[:20] + short_packet[30:] + short_packet + short_packet
+    framer = SyncFramer()
+    packets = []
+    for i in range(len(stream)):
+        packets += list(framer.feed(stream[i:i + 1]))
+
+    assert packets == [short_packet, short_packet]
+    assert framer.get_statistics()['resync_events'] == 1
+
+
+def test_inserted_byte_does_not_lose_the_next_packet():
+    short_packet = make_unsegmented_packet(50)
+    framer = SyncFramer()
+    packets = list(framer.feed(short_packet[:20] + b'\x55' + short_packet[20:] + short_packet))
+
+    assert len(packets) == 2
+    assert packets[1] == short_packet
+    assert framer.resync_events == 0
+
+
+def test_sync_pattern_in_packet_data_is_not_a_resync():
+    # 08 3F followed by a continuation segment header can't be the start of a new packet
+    packet = make_unsegmented_packet(50)
+    packet = packet[:20] + bytes([0x08, 0x3F, 0x00, 0x00, 0x00, 0x10]) + packet[26:]
+    framer = SyncFramer()
+
+    assert list(framer.feed(packet + packet)) == [packet, packet]
+    assert framer.resync_events == 0
@@ -0,0 +1,199 @@
+import json
+import os
+import struct
+import pytest
+from telemetry_dictionary import compile_definition, find_packet_offsets, load_decoder, load_definition
+
+csv_definition = '''# Comment lines are skipped
+name,offset,type,endianness,scale,units,limit_low,limit_high
+counter,0,uint8,big,1,,,
+voltage,2,int16,big,0.001,V,10,14
+temperature,4,uint16,little,0.01,K,,
+tai_seconds,6,float64,big,,s,,
+'''
+packet = struct.pack('>BxhHd', 7, 12345, 0x3412, 12.5)  # temperature is little endian: 0x1234
+
+
+def write_definition(tmpdir, filename, contents):
+    definition_filename = str(tmpdir.join(filename))
+    with open(definition_filename, 'w') as definition_file:
+        definition_file.write(contents)
+    return definition_filename
+
+
+def test_csv_definition_decodes(tmpdir):
+    decoder = load_decoder(write_definition(tmpdir, 'points.csv', csv_definition), cache_folder=False)
+    telemetry = decoder.decode(b'\xff\xff' + packet, offset=2)
+
+    assert telemetry['counter'] == 7
+    assert telemetry['voltage'] == pytest.approx(12.345)
+    assert telemetry['temperature'] == pytest.approx(0x1234 * 0.01)
+    assert telemetry['tai_seconds'] == 12.5
+    assert decoder.packet_length == 14
+    assert decoder.units['voltage'] == 'V'
+    assert len(decoder.layouts) == 2  # One struct per byte order
+
+
+def test_json_definition_matches_csv(tmpdir):
+    points = [point._asdict() for point in load_definition(write_definition(tmpdir, 'points.csv', csv_definition))]
+    json_filename = write_definition(tmpdir, 'points.json', json.dumps(points))
+
+    assert load_definition(json_filename) == load_definition(str(tmpdir.join('points.csv')))
+
+
+def test_limits(tmpdir):
+    decoder = load_decoder(write_definition(tmpdir, 'points.csv', csv_definition), cache_folder=False)
+
+    assert decoder.out_of_limits(decoder.decode(packet)) == []
+    assert decoder.out_of_limits({'voltage': 9.9}) == ['voltage']
+    assert decoder.out_of_limits({'voltage': 14.1}) == ['voltage']
+
+
+def test_compiled_form_is_cached_by_hash(tmpdir):
+    cache_folder = str(tmpdir.join('cache'))
+    definition_filename = write_definition(tmpdir, 'points.csv', csv_definition)
+    telemetry = load_decoder(definition_filename, cache_folder).decode(packet)
+    cache_filenames = os.listdir(cache_folder)
+    assert len(cache_filenames) == 1
+
+    # A cache hit never reads the definition, so a doctored cache file shows whether it was used
+    cache_filename = os.path.join(cache_folder, cache_filenames[0])
+    with open(cache_filename) as cache_file:
+        compiled = json.load(cache_file)
+    compiled['units']['voltage'] = 'from cache'
+    with open(cache_filename, 'w') as cache_file:
+        json.dump(compiled, cache_file)
+    decoder = load_decoder(definition_filename, cache_folder)
+    assert decoder.units['voltage'] == 'from cache'
+    assert decoder.decode(packet) == telemetry
+
+    # Any edit to the definition is a new hash, so it gets compiled again
+    write_definition(tmpdir, 'points.csv', csv_definition + 'spare,1,uint8,big,1,,,\n')
+    assert 'spare' in load_decoder(definition_filename, cache_folder).decode(packet)
+    assert len(os.listdir(cache_folder)) == 2
+
+
+def test_bad_definitions(tmpdir):
+    with pytest.raises(ValueError):
+        load_definition(write_definition(tmpdir, 'points.csv', 'name,offset,type\na,0,int24\n'))
+    with pytest.raises(ValueError):
+        load_definition(write_definition(tmpdir, 'points.csv', 'name,offset,type,endianness\na,0,int8,middle\n'))
+    with pytest.raises(ValueError):
+        load_definition(write_definition(tmpdir, 'points.csv', 'name,type\na,int8\n'))
+    overlapping_points = load_definition(write_definition(tmpdir, 'points.csv',
+                                                          'name,offset,type\na,10,uint32\nb,12,uint16\n'))
+    with pytest.raises(ValueError):
+        compile_definition(overlapping_points)
+
+
+def test_batch_decode_matches_single_packets(tmpdir):
+    decoder = load_decoder(write_definition(tmpdir, 'points.csv', csv_definition), cache_folder=False)
+    packets = [struct.pack('>BxhHd', i, 100 * i - 5000, i << 8, i / 4) for i in range(100)]
+    telemetry = [decoder.decode(packet) for packet in packets]
+
+    # Laid end to end with 2 byte gaps, e.g., fixed length records
+    batch = decoder.decode_batch(b'\x00\x00'.join(packets), stride=len(packets[0]) + 2)
+    for name in telemetry[0]:
+        assert batch[name].tolist() == [packet_telemetry[name] for packet_telemetry in telemetry]
+
+    # At irregular offsets
+    buffer = bytearray()
+    offsets = []
+    for i, packet in enumerate(packets):
+        buffer += b'\xaa' * (i % 5)
+        offsets.append(len(buffer))
+        buffer += packet
+    batch = decoder.decode_batch(buffer, offsets=offsets)
+    assert batch['voltage'].tolist() == [packet_telemetry['voltage'] for packet_telemetry in telemetry]
+
+
+def test_bitfields(tmpdir):
+    definition = csv_definition.replace('limit_high\n', 'limit_high,bits\n') + '\n'.join([
+        'valid,1,uint8,big,1,,,,0',
+        'status,1,uint8,big,1,,,,1-2',
+        'mode,1,uint8,big,1,,,,4-7',
+        'high_bit,2,int16,big,1,,,,15']) + '\n'
+    decoder = load_decoder(write_definition(tmpdir, 'points.csv', definition), cache_folder=False)
+    flags_packet = packet[:1] + bytes([0b10100101]) + packet[2:]
+    telemetry = decoder.decode(flags_packet)
+
+    assert (telemetry['valid'], telemetry['status'], telemetry['mode'], telemetry['high_bit']) == (1, 2, 10, 0)
+    assert telemetry['voltage'] == pytest.approx(12.345)  # Flags can share an integer with a whole point
+    assert len(decoder.bit_layouts) == 1  # Every flag in the same byte order comes from one unpack
+
+    batch = decoder.decode_batch(flags_packet * 3, stride=len(flags_packet))
+    assert {name: values[1] for name, values in batch.items()} == telemetry
+
+    with pytest.raises(ValueError):
+        load_definition(write_definition(tmpdir, 'bad.csv', 'name,offset,type,bits\na,0,float32,0\n'))
+    with pytest.raises(ValueError):
+        load_definition(write_definition(tmpdir, 'bad.csv', 'name,offset,type,bits\na,0,uint8,3-1\n'))
+    with pytest.raises(ValueError):
+        compile_definition(load_definition(write_definition(tmpdir, 'bad.csv',
+                                                            'name,offset,type,bits\na,0,uint8,6-8\n')))
+    with pytest.raises(ValueError):  # Flags at the same offset have to agree on the integer they're in
+        compile_definition(load_definition(write_definition(tmpdir, 'bad.csv',
+                                                            'name,offset,type,bits\na,0,uint8,0\nb,0,uint16,1\n')))
+
+
+def test_projection(tmpdir):
+    decoder = load_decoder(write_definition(tmpdir, 'points.csv', csv_definition), cache_folder=False)
+    fields = ['temperature', 'voltage']
+    projection = decoder.project(fields)
+    telemetry = decoder.decode(packet)
+
+    assert decoder.decode(packet, fields=fields) == {name: telemetry[name] for name in fields}
+    assert decoder.project(fields) is projection  # Compiled once
+    assert projection.layouts[0][0].format == '>2xh'  # Skips everything else
+    assert projection.packet_length == decoder.packet_length
+    assert projection.limits == {'voltage': (10.0, 14.0)}
+
+    # Irregular offsets only gather the 4 bytes the two fields read
+    assert len(projection.gather_indices) == 4
+    for batch in [decoder.decode_batch(packet * 3 + packet[:-1], stride=len(packet), fields=fields),
+                  decoder.decode_batch(b'\x00' + packet * 3, offsets=[1, 15, 29], fields=fields)]:
+        assert sorted(batch) == sorted(fields)
+        assert [len(values) for values in batch.values()] == [3, 3]
+        assert {name: values[2] for name, values in batch.items()} == {name: telemetry[name] for name in fields}
+
+    with pytest.raises(KeyError):
+        decoder.project(['missing'])
+
+
+def test_record_decodes_on_first_read(tmpdir):
+    decoder = load_decoder(write_definition(tmpdir, 'points.csv', csv_definition), cache_folder=False)
+    buffer = bytearray(b'\xff' + packet)
+    record = decoder.record(buffer, offset=1)
+
+    assert record['voltage'] == pytest.approx(12.345)
+    assert record.tai_seconds == 12.5
+    buffer[1] = 99  # Not read yet, so the change shows; voltage was read, so it's kept
+    buffer[3:5] = b'\x00\x00'
+    assert record['counter'] == 99
+    assert record['voltage'] == pytest.approx(12.345)
+
+    assert len(record) == 4 and set(record) == set(decoder.decode(buffer, offset=1))
+    assert 'temperature' in record and 'missing' not in record
+    assert record.get('missing') is None
+    with pytest.raises(KeyError):
+        record['missing']
+    with pytest.raises(AttributeError):
+        record.missing
+
+    telemetry = record.materialize()
+    assert type(telemetry) is dict
+    assert telemetry['voltage'] == pytest.approx(12.345)  # Read before the buffer changed, so kept
+    assert telemetry['counter'] == 99
+    assert telemetry['temperature'] == pytest.approx(0x1234 * 0.01)
+    assert telemetry['tai_seconds'] == 12.5
+    assert decoder.decode(buffer, offset=1)['voltage'] == 0  # What a fresh decode would have given
+    assert record == telemetry
+
+
+def test_find_packet_offsets():
+    sync_bytes = b'\x08\x3f'
+    packet = sync_bytes + b'\x00\x08\x3f\x00'  # Sync pattern inside the packet isn't a packet start
+    buffer = b'\x08' + packet + b'\x11' * 3 + packet + packet + packet[:4]
+
+    assert find_packet_offsets(buffer, sync_bytes, len(packet)).tolist() == [1, 10, 16]
+    assert len(find_packet_offsets(b'\x08', sync_bytes, len(packet))) == 0